@@ -1,9 +1,12 @@
 import asyncio
+import heapq
 import logging
-from typing import List, Dict
+from collections import OrderedDict
+from typing import List, Dict, Optional
 import time
 from datetime import datetime
-import requests
+import httpx
+import json
 from dotenv import load_dotenv
 import os
 import random
@@ -17,53 +20,156 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Define agents configuration
-AGENTS = [
-    {
-        "name": "Tech Enthusiast",
-        "role": "AI Technology Expert",
-        "description": "Passionate about the latest AI developments and tools",
-        "avatar": "🤖",
-        "templates": [
-            "Just discovered an amazing AI tool! {emoji}",
-            "The future of AI is looking bright! {emoji}",
-            "Check out this cool tech development! {emoji}"
-        ],
-        "emojis": ["🤖", "💻", "🚀", "⚡"]
-    },
-    {
-        "name": "Community Builder",
-        "role": "Community Manager",
-        "description": "Focused on building and engaging the AI community",
-        "avatar": "🤝",
-        "templates": [
-            "Let's connect and share our AI experiences! {emoji}",
-            "What's your favorite AI tool? {emoji}",
-            "Join our growing community! {emoji}"
-        ],
-        "emojis": ["🤝", "🌟", "💡", "🎯"]
-    },
-    {
-        "name": "AI Explorer",
-        "role": "AI Researcher",
-        "description": "Exploring the frontiers of artificial intelligence",
-        "avatar": "🔍",
-        "templates": [
-            "Exploring new AI frontiers! {emoji}",
-            "The possibilities with AI are endless! {emoji}",
-            "Learning something new about AI every day! {emoji}"
-        ],
-        "emojis": ["🔍", "🎓", "💫", "🌌"]
-    }
-]
+# Persona definitions, one JSON object per agent
+PERSONAS_FILE = os.getenv(
+    "AGENT_PERSONAS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json")
+)
+# Seconds between posts by a persona that sets no interval
+DEFAULT_INTERVAL = 60
+# Posts due together go to /posts/batch in chunks within the backend's MAX_BATCH_SIZE
+POST_BATCH_SIZE = 100
+
+def load_personas(path: str) -> List[Dict]:
+    """Read personas from a JSON list, filling in optional fields.
+
+    Each persona posts every interval seconds on average, varied by up to
+    jitter (a fraction of interval) either way.
+    """
+    with open(path, encoding="utf-8") as f:
+        personas = json.load(f)
+    names = set()
+    for persona in personas:
+        missing = [key for key in ("name", "role", "templates", "emojis") if not persona.get(key)]
+        if missing:
+            raise ValueError(f"Persona {persona.get('name', '?')} is missing {', '.join(missing)}")
+        if persona["name"] in names:
+            raise ValueError(f"Duplicate persona name {persona['name']}")
+        names.add(persona["name"])
+        persona.setdefault("description", "")
+        persona.setdefault("avatar", "")
+        persona.setdefault("version", "1.0.0")
+        persona["interval"] = float(persona.get("interval", DEFAULT_INTERVAL))
+        if persona["interval"] <= 0:
+            raise ValueError(f"Persona {persona['name']} needs a positive interval")
+        persona["jitter"] = min(max(float(persona.get("jitter", 0.0)), 0.0), 1.0)
+    return personas
+
+AGENTS = load_personas(PERSONAS_FILE)
+
+# Posts per /posts page when rescanning after a reset
+RESCAN_PAGE_SIZE = 500
+# Longest the main loop sleeps, so the checkpoint stays recent
+CHECKPOINT_INTERVAL = 5
+
+class RecentIds:
+    """The last maxlen ids added, for skipping posts already processed"""
+
+    def __init__(self, ids: List[str] = (), maxlen: int = 10000):
+        self.maxlen = maxlen
+        self.ids = OrderedDict.fromkeys(ids[-maxlen:] if maxlen else [])
+
+    def add(self, post_id: str):
+        self.ids[post_id] = None
+        self.ids.move_to_end(post_id)
+        if len(self.ids) > self.maxlen:
+            self.ids.popitem(last=False)
+
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+class CircuitBreaker:
+    """Stops calls to a failing service until a health probe succeeds.
+
+    Opens after threshold consecutive failures. While open, callers wait on
+    closed and probes are spaced by a delay that doubles with every further
+    failure, up to max_delay.
+    """
+
+    def __init__(self, threshold: int = 3, max_delay: float = 30.0):
+        self.threshold = threshold
+        self.max_delay = max_delay
+        self.failures = 0
+        self.closed = asyncio.Event()
+        self.closed.set()
+
+    @property
+    def is_open(self) -> bool:
+        return not self.closed.is_set()
+
+    def record_success(self):
+        if self.is_open:
+            logger.info("Agent service recovered, resuming sends")
+        self.failures = 0
+        self.closed.set()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold and not self.is_open:
+            logger.warning(f"Agent service failed {self.failures} times, pausing sends")
+            self.closed.clear()
+
+    def probe_delay(self) -> float:
+        """Seconds until the next health probe after a failure"""
+        return min(self.max_delay, 2.0 ** max(self.failures - 1, 0))
 
 class AgentManager:
     def __init__(self):
         self.api_url = os.getenv("API_URL", "http://localhost:8000")
         self.agent_url = os.getenv("AGENT_URL", "http://localhost:9000")
-        self.processed_posts = set()
+        self.changes_seq = 0  # Backend change seq up to which every post is handled
+        self.received_seq = 0  # Last change seq read, whether or not its post is sent yet
+        # Posts created at or after created_mark may not have been handled yet
+        self.created_mark = ""
+        self.newest_created_at = ""
+        # Where changes_seq, created_mark and the recent ids survive restarts
+        self.checkpoint_file = os.getenv(
+            "AGENT_CHECKPOINT_FILE", os.path.join(os.getenv("DATA_DIR", "data"), "agent_checkpoint.json")
+        )
+        self.checkpoint_dirty = False
+        self.processed_posts = self.load_checkpoint(int(os.getenv("AGENT_DEDUP_WINDOW", "10000")))
+        # Follow the backend's /changes/stream instead of polling /changes
+        self.subscribe = os.getenv("AGENT_SUBSCRIBE", "true").lower() == "true"
         self.running = True
-        self.last_agent_post = datetime.min
+        # One pooled client for every call to the backend and the agent, so
+        # connections are kept alive and reused instead of opened per request
+        timeout = float(os.getenv("AGENT_HTTP_TIMEOUT", "10"))
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("AGENT_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("AGENT_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=30.0,
+            ),
+        )
+        # Posts are sent to the webhook concurrently, at most this many at once
+        self.send_slots = asyncio.Semaphore(int(os.getenv("AGENT_CONCURRENCY", "8")))
+        self.send_retries = int(os.getenv("AGENT_SEND_RETRIES", "3"))
+        self.retry_backoff = float(os.getenv("AGENT_RETRY_BACKOFF", "0.5"))  # seconds, doubled per retry
+        self.sending: Dict[str, tuple] = {}  # Post id -> (seq of its change, created_at)
+        self.send_tasks = set()
+        # Polling backs off from AGENT_POLL_MIN to AGENT_POLL_MAX seconds while
+        # nothing arrives or the backend fails, and drops back on new posts
+        self.poll_min = float(os.getenv("AGENT_POLL_MIN", "0.5"))
+        self.poll_max = float(os.getenv("AGENT_POLL_MAX", "30"))
+        self.poll_interval = self.poll_min
+        self.health_interval = float(os.getenv("AGENT_HEALTH_INTERVAL", "30"))
+        self.health_monitor = None
+        self.agent_breaker = CircuitBreaker(
+            threshold=int(os.getenv("AGENT_BREAKER_THRESHOLD", "3")),
+            max_delay=self.health_interval
+        )
+        # Timer heap of (monotonic due time, persona index). Personas start at
+        # a random point in their first interval so they do not all post at once.
+        self.personas = AGENTS
+        now = time.monotonic()
+        self.schedule = [
+            (now + random.uniform(0, persona["interval"]), index)
+            for index, persona in enumerate(self.personas)
+        ]
+        heapq.heapify(self.schedule)
         self.status = {
             "last_post_time": None,
             "last_agent": None,
@@ -78,102 +184,302 @@ class AgentManager:
                 "role": agent["role"],
                 "description": agent["description"],
                 "avatar": agent["avatar"]
-            } for agent in AGENTS}
+            } for agent in self.personas}
         }
-        
-    async def create_agent_post(self):
-        """Create a new post from an agent"""
+    
+    def load_checkpoint(self, window: int) -> RecentIds:
+        """Resume from the checkpoint file, if any; returns the recent ids"""
         try:
-            # Check if enough time has passed since last agent post
-            time_since_last_post = (datetime.now() - self.last_agent_post).total_seconds()
-            if time_since_last_post < 60:  # Reduced to 1 minute between posts
-                return
-            
-            # Select a random agent
-            agent = random.choice(AGENTS)
-            template = random.choice(agent["templates"])
-            emoji = random.choice(agent["emojis"])
-            
-            # Create the post content
-            content = template.format(emoji=emoji)
-            
-            # Send the post to the API
-            response = requests.post(
-                f"{self.api_url}/posts",
-                data={
-                    "content": content,
-                    "agent": agent["name"],
-                    "role": agent["role"],
-                    "avatar": agent["avatar"],
-                    "agent_version": "1.0.0"
-                }
-            )
-            response.raise_for_status()
+            with open(self.checkpoint_file) as f:
+                checkpoint = json.load(f)
+            changes_seq = checkpoint["changes_seq"]
+            created_mark = checkpoint["created_mark"]
+            recent_ids = RecentIds(checkpoint["recent_ids"], maxlen=window)
+        except FileNotFoundError:
+            return RecentIds(maxlen=window)
+        except Exception as e:
+            logger.error(f"Error reading checkpoint, starting over: {str(e)}")
+            return RecentIds(maxlen=window)
+        self.changes_seq = self.received_seq = changes_seq
+        self.created_mark = self.newest_created_at = created_mark
+        logger.info(f"Resuming from change seq {self.changes_seq}")
+        return recent_ids
+    
+    def save_checkpoint(self):
+        """Atomically write the checkpoint if it changed since the last save"""
+        if not self.checkpoint_dirty:
+            return
+        self.checkpoint_dirty = False
+        checkpoint = {
+            "changes_seq": self.changes_seq,
+            "created_mark": self.created_mark,
+            "recent_ids": list(self.processed_posts.ids)
+        }
+        try:
+            os.makedirs(os.path.dirname(self.checkpoint_file) or ".", exist_ok=True)
+            tmp_path = f"{self.checkpoint_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.checkpoint_file)
+        except Exception as e:
+            error_msg = f"Error saving checkpoint: {str(e)}"
+            logger.error(error_msg)
+            self.status["last_error"] = error_msg
+            self.checkpoint_dirty = True
+        
+    def next_interval(self, persona: Dict) -> float:
+        """Seconds until a persona's next post, jittered around its interval"""
+        jitter = persona["jitter"]
+        return persona["interval"] * random.uniform(1 - jitter, 1 + jitter)
+    
+    def next_post_due(self) -> float:
+        """Monotonic time at which the next persona is due to post"""
+        return self.schedule[0][0] if self.schedule else float("inf")
+    
+    def compose_post(self, persona: Dict) -> Dict:
+        template = random.choice(persona["templates"])
+        emoji = random.choice(persona["emojis"])
+        return {
+            "content": template.format(emoji=emoji),
+            "agent": persona["name"],
+            "role": persona["role"],
+            "avatar": persona["avatar"],
+            "agent_version": persona["version"]
+        }
+    
+    async def create_agent_posts(self) -> bool:
+        """Create a post for every persona that is due. Returns False if the
+        backend failed; the personas it failed for stay due.
+
+        Due personas are popped off the timer heap, O(log N) each, and pushed
+        back with their next jittered due time. A single due post goes to
+        POST /posts; several go to /posts/batch.
+        """
+        now = time.monotonic()
+        due = []
+        while self.schedule and self.schedule[0][0] <= now:
+            due.append(heapq.heappop(self.schedule))
+        for start in range(0, len(due), POST_BATCH_SIZE):
+            chunk = due[start:start + POST_BATCH_SIZE]
+            posts = [self.compose_post(self.personas[index]) for _, index in chunk]
+            try:
+                if len(posts) == 1:
+                    response = await self.client.post(f"{self.api_url}/posts", data=posts[0])
+                    response.raise_for_status()
+                    created = [True]
+                else:
+                    response = await self.client.post(f"{self.api_url}/posts/batch", json=posts)
+                    response.raise_for_status()
+                    created = [result["post"] is not None for result in response.json()["results"]]
+            except Exception as e:
+                error_msg = f"Error creating agent post: {str(e)}"
+                logger.error(error_msg)
+                self.status["last_error"] = error_msg
+                for entry in due[start:]:
+                    heapq.heappush(self.schedule, entry)
+                return False
             
             # Update status
-            now = datetime.now()
-            self.status["last_post_time"] = now
-            self.status["last_agent"] = agent["name"]
+            posted_at = datetime.now()
+            for (_, index), post, ok in zip(chunk, posts, created):
+                persona = self.personas[index]
+                heapq.heappush(self.schedule, (now + self.next_interval(persona), index))
+                if not ok:
+                    logger.error(f"Backend rejected post by agent '{persona['name']}'")
+                    continue
+                agent_status = self.status["agent_status"][persona["name"]]
+                agent_status["count"] += 1
+                agent_status["last_post_time"] = posted_at
+                self.status["total_posts_created"] += 1
+                logger.info(f"Agent '{persona['name']}' ({persona['role']}) created a new post: {post['content']}")
+            persona = self.personas[chunk[-1][1]]
+            self.status["last_post_time"] = posted_at
+            self.status["last_agent"] = persona["name"]
             self.status["last_agent_details"] = {
-                "role": agent["role"],
-                "description": agent["description"],
-                "avatar": agent["avatar"]
+                "role": persona["role"],
+                "description": persona["description"],
+                "avatar": persona["avatar"]
             }
-            self.status["total_posts_created"] += 1
-            self.status["agent_status"][agent["name"]]["count"] += 1
-            self.status["agent_status"][agent["name"]]["last_post_time"] = now
             self.status["last_error"] = None
-            
-            logger.info(f"Agent '{agent['name']}' ({agent['role']}) created a new post: {content}")
-            self.last_agent_post = now
-            
-        except Exception as e:
-            error_msg = f"Error creating agent post: {str(e)}"
-            logger.error(error_msg)
-            self.status["last_error"] = error_msg
+        return True
     
-    async def process_new_posts(self):
-        """Process new posts that haven't been handled by agents yet"""
+    async def process_new_posts(self) -> Optional[int]:
+        """Process new posts that haven't been handled by agents yet.
+        Returns how many changes were read, or None if the backend failed."""
         try:
-            response = requests.get(f"{self.api_url}/posts")
+            response = await self.client.get(f"{self.api_url}/changes", params={"since": self.changes_seq})
             response.raise_for_status()
-            posts = response.json()
+            feed = response.json()
             
-            for post in posts:
-                if post["id"] not in self.processed_posts:
-                    logger.info(f"Processing new post: {post['id']}")
-                    await self.send_to_agent(post)
-                    self.processed_posts.add(post["id"])
-                    self.status["total_posts_processed"] += 1
+            seq = feed["seq"]
+            if feed["reset"]:
+                await self.rescan_posts(seq)
+            else:
+                for change in feed["changes"]:
+                    if self.agent_breaker.is_open:
+                        # Leave the rest for the poll after the agent recovers
+                        # rather than waiting here for an in-flight slot
+                        seq = change["seq"] - 1
+                        break
+                    if change["op"] == "create_post":
+                        await self.handle_new_post(change["post"], change["seq"])
+            self.advance_seq(seq)
+            return 1 if feed["reset"] else len(feed["changes"])
         except Exception as e:
             error_msg = f"Error processing posts: {str(e)}"
             logger.error(error_msg)
             self.status["last_error"] = error_msg
+            return None
     
-    async def send_to_agent(self, post: Dict):
-        """Send post to agent for processing"""
+    async def handle_new_post(self, post: Dict, seq: int):
+        """Start sending a post to the agent unless it is already handled.
+
+        Only waits for a free in-flight slot, so changes keep being read while
+        earlier posts are still at the webhook. Posts are independent and may
+        finish in any order; changes_seq only moves past a change once its post
+        is done, so a restart or reconnect never skips one.
+        """
+        self.newest_created_at = max(self.newest_created_at, post["created_at"])
+        if post["id"] in self.processed_posts or post["id"] in self.sending:
+            return
+        await self.send_slots.acquire()
+        self.sending[post["id"]] = (seq, post["created_at"])
+        task = asyncio.create_task(self.process_post(post))
+        self.send_tasks.add(task)
+        task.add_done_callback(self.send_tasks.discard)
+    
+    async def process_post(self, post: Dict):
+        """Send one post to the agent and release its in-flight slot"""
         try:
-            payload = {
-                "post_id": post["id"],
-                "content": post["content"],
-                "image_path": post.get("image_path")
-            }
-            
-            response = requests.post(
-                f"{self.agent_url}/webhook",
-                json=payload
-            )
+            logger.info(f"Processing new post: {post['id']}")
+            while True:
+                # Hold the post while the agent service is known to be down
+                await self.agent_breaker.closed.wait()
+                if await self.send_to_agent(post):
+                    self.agent_breaker.record_success()
+                    self.processed_posts.add(post["id"])
+                    self.status["total_posts_processed"] += 1
+                    break
+                self.agent_breaker.record_failure()
+                # Only posts caught by an outage are sent again once it is over
+                if not self.agent_breaker.is_open:
+                    break
+        finally:
+            del self.sending[post["id"]]
+            self.send_slots.release()
+            self.advance_seq()
+    
+    def advance_seq(self, seq: Optional[int] = None):
+        """Record seq as read and move changes_seq and created_mark up to the
+        oldest post still being sent"""
+        if seq is not None:
+            self.received_seq = seq
+        if self.sending:
+            self.changes_seq = min(self.received_seq, min(s for s, _ in self.sending.values()) - 1)
+            self.created_mark = min(created_at for _, created_at in self.sending.values())
+        else:
+            self.changes_seq = self.received_seq
+            self.created_mark = self.newest_created_at
+        self.checkpoint_dirty = True
+    
+    async def rescan_posts(self, seq: int):
+        """Hand over posts from /posts, newest first, back to created_mark.
+
+        Used on a reset, when the backend no longer retains the changes after
+        changes_seq. Posts at created_mark itself are included; the recent ids
+        skip the ones already processed.
+        """
+        params = {"limit": RESCAN_PAGE_SIZE}
+        while True:
+            response = await self.client.get(f"{self.api_url}/posts", params=params)
             response.raise_for_status()
-            logger.info(f"Successfully processed post {post['id']} with agent")
-        except Exception as e:
-            error_msg = f"Error sending to agent: {str(e)}"
-            logger.error(error_msg)
-            self.status["last_error"] = error_msg
+            for post in response.json():
+                if post["created_at"] < self.created_mark:
+                    return
+                await self.handle_new_post(post, seq)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+    
+    async def subscribe_changes(self):
+        """Follow the backend change stream, resuming from the last seen seq on
+        reconnect. Reconnects back off exponentially while the backend is down."""
+        delay = self.poll_min
+        while self.running:
+            try:
+                # The stream stays open indefinitely, so it has no read timeout
+                async with self.client.stream(
+                    "GET",
+                    f"{self.api_url}/changes/stream",
+                    params={"since": self.changes_seq},
+                    timeout=httpx.Timeout(10.0, read=None)
+                ) as response:
+                    response.raise_for_status()
+                    logger.info(f"Subscribed to change stream from seq {self.changes_seq}")
+                    delay = self.poll_min
+                    event, data = None, []
+                    async for line in response.aiter_lines():
+                        if line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif line.startswith("data:"):
+                            data.append(line[5:].strip())
+                        elif not line and data:
+                            await self.handle_change(event, json.loads("\n".join(data)))
+                            event, data = None, []
+            except Exception as e:
+                error_msg = f"Change stream error: {str(e)}"
+                logger.error(error_msg)
+                self.status["last_error"] = error_msg
+            if self.running:
+                await asyncio.sleep(delay)  # Wait before reconnecting
+                delay = min(delay * 2, self.poll_max)
+    
+    async def handle_change(self, event: str, change: Dict):
+        """Handle a single event from the change stream"""
+        if event == "reset":
+            # Resumed outside the backend's retained history
+            await self.rescan_posts(change["seq"])
+        elif event == "create_post":
+            await self.handle_new_post(change["post"], change["seq"])
+        self.advance_seq(change["seq"])
+    
+    async def send_to_agent(self, post: Dict) -> bool:
+        """Send post to agent for processing, retrying with exponential backoff.
+        Returns whether the agent accepted it."""
+        payload = {
+            "post_id": post["id"],
+            "content": post["content"],
+            "image_path": post.get("image_path")
+        }
+        for attempt in range(self.send_retries + 1):
+            try:
+                response = await self.client.post(
+                    f"{self.agent_url}/webhook",
+                    json=payload
+                )
+                response.raise_for_status()
+                logger.info(f"Successfully processed post {post['id']} with agent")
+                return True
+            except Exception as e:
+                error_msg = f"Error sending to agent: {str(e)}"
+                logger.error(error_msg)
+                self.status["last_error"] = error_msg
+                # A rejected payload fails the same way every time
+                if isinstance(e, httpx.HTTPStatusError):
+                    status_code = e.response.status_code
+                    if status_code < 500 and status_code != 429:
+                        break
+                if attempt < self.send_retries:
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        return False
     
     async def health_check(self):
         """Periodic health check of agent service"""
         try:
-            response = requests.get(f"{self.agent_url}/health")
+            response = await self.client.get(f"{self.agent_url}/health")
             response.raise_for_status()
             logger.info("Agent health check successful")
             return True
@@ -187,24 +493,46 @@ class AgentManager:
         """Main loop for agent manager"""
         logger.info("Starting Agent Manager")
         
-        # Create first post immediately
-        await self.create_agent_post()
+        if self.subscribe:
+            self.subscription = asyncio.create_task(self.subscribe_changes())
+        # Health checks run on their own so that nothing waiting on the
+        # breaker, such as a poll blocked on in-flight slots, can stall them
+        self.health_monitor = asyncio.create_task(self.monitor_health())
         
+        next_poll = time.monotonic()
+        next_post = self.next_post_due()
+        post_retry = self.poll_min
         while self.running:
             try:
-                # Check agent health
-                if not await self.health_check():
-                    logger.warning("Agent service is not healthy, attempting to restart...")
-                    # Here you would implement agent service restart logic
+                now = time.monotonic()
+                
+                # Process new posts, unless the change stream is delivering them
+                # or the agent could not take them
+                if not self.subscribe and now >= next_poll and not self.agent_breaker.is_open:
+                    count = await self.process_new_posts()
+                    if count:
+                        self.poll_interval = self.poll_min
+                    else:
+                        self.poll_interval = min(self.poll_interval * 2, self.poll_max)
+                    next_poll = now + self.poll_interval
                 
-                # Process new posts
-                await self.process_new_posts()
+                # Create posts for the personas that are due, backing off while
+                # the backend refuses them
+                if now >= next_post:
+                    if await self.create_agent_posts():
+                        post_retry = self.poll_min
+                        next_post = self.next_post_due()
+                    else:
+                        next_post = now + post_retry
+                        post_retry = min(post_retry * 2, self.poll_max)
                 
-                # Create new agent posts
-                await self.create_agent_post()
+                self.save_checkpoint()
                 
-                # Sleep for a while before next iteration
-                await asyncio.sleep(5)  # Check every 5 seconds
+                # Sleep until the next job is due
+                wake = min(next_post, now + CHECKPOINT_INTERVAL)
+                if not self.subscribe and not self.agent_breaker.is_open:
+                    wake = min(wake, next_poll)
+                await asyncio.sleep(max(0.0, wake - time.monotonic()))
                 
             except Exception as e:
                 error_msg = f"Error in agent manager loop: {str(e)}"
@@ -212,13 +540,39 @@ class AgentManager:
                 self.status["last_error"] = error_msg
                 await asyncio.sleep(5)  # Wait before retrying
 
+    async def monitor_health(self):
+        """Check agent health every health_interval, probing sooner after failures"""
+        while self.running:
+            if await self.health_check():
+                self.agent_breaker.record_success()
+                delay = self.health_interval
+            else:
+                self.agent_breaker.record_failure()
+                delay = self.agent_breaker.probe_delay()
+                # Here you would implement agent service restart logic
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        """Stop the main loop and release pooled connections"""
+        self.running = False
+        if self.health_monitor:
+            self.health_monitor.cancel()
+        for task in list(self.send_tasks):
+            task.cancel()
+        await asyncio.gather(*self.send_tasks, return_exceptions=True)
+        self.save_checkpoint()
+        await self.client.aclose()
+
     def get_status(self):
         """Get current status of the agent manager"""
         return {
             **self.status,
             "uptime": str(datetime.now() - self.status["uptime"]),
-            "next_post_in": max(0, 60 - (datetime.now() - self.last_agent_post).total_seconds()),
-            "agents": AGENTS  # Include full agent information
+            "posts_in_flight": len(self.sending),
+            "poll_interval": self.poll_interval,
+            "agent_circuit": "open" if self.agent_breaker.is_open else "closed",
+            "next_post_in": max(0, self.next_post_due() - time.monotonic()) if self.schedule else None,
+            "agents": self.personas  # Include full agent information
         }
 
 # Create FastAPI app for status endpoint
@@ -237,10 +591,13 @@ async def main():
     server = uvicorn.Server(config)
     
     # Run both the agent manager and status server
-    await asyncio.gather(
-        manager.run(),
-        server.serve()
-    )
+    try:
+        await asyncio.gather(
+            manager.run(),
+            server.serve()
+        )
+    finally:
+        await manager.close()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
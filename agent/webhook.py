@@ -46,8 +46,10 @@ def process_with_agent(content: str) -> dict:
         logger.error(f"Error in agent processing: {str(e)}")
         raise
 
+# A plain def runs in the threadpool, so the blocking agent call does not
+# stall concurrent webhook requests
 @app.post("/webhook")
-async def handle_webhook(payload: WebhookPayload):
+def handle_webhook(payload: WebhookPayload):
     try:
         logger.info(f"Received webhook for post {payload.post_id}")
         
@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable
+
+class FragmentCache:
+    """LRU cache of pre-encoded JSON fragments keyed by post id.
+
+    A post can have several encodings (e.g. with different reply previews),
+    cached side by side under a variant key. Entries are dropped explicitly
+    when the post they encode changes, so a hit is always byte-for-byte what
+    encoding the post now would produce.
+    """
+
+    def __init__(self, encode: Callable[[Dict, int], bytes], max_size: int = 10000):
+        self.encode = encode
+        self.max_size = max_size
+        self._fragments: "OrderedDict[str, Dict[int, bytes]]" = OrderedDict()
+
+    def get(self, post: Dict, variant: int = 0) -> bytes:
+        post_id = post["id"]
+        variants = self._fragments.get(post_id)
+        if variants is None:
+            variants = self._fragments[post_id] = {}
+            if len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+        else:
+            self._fragments.move_to_end(post_id)
+        fragment = variants.get(variant)
+        if fragment is None:
+            fragment = variants[variant] = self.encode(post, variant)
+        return fragment
+
+    def invalidate(self, post_id: str) -> None:
+        self._fragments.pop(post_id, None)
+
+    def clear(self) -> None:
+        self._fragments.clear()
+
+    def encode_list(self, posts: Iterable[Dict], variant: int = 0) -> bytes:
+        """Assemble a JSON array from cached fragments"""
+        return b"[" + b",".join(self.get(post, variant) for post in posts) + b"]"
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+class ChangeBroker:
+    """Fans store change records out to Server-Sent Events subscribers.
+
+    Each subscriber gets its own bounded queue. A subscriber that falls too far
+    behind is dropped rather than allowed to grow without bound; it reconnects
+    with Last-Event-ID and catches up from the store's change journal.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self.subscribers: Set[asyncio.Queue] = set()
+        # Seq of the last record published
+        self.last_seq = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def publish(self, record: Dict) -> None:
+        self.last_seq = record["seq"]
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                logger.warning("Dropping slow change stream subscriber")
+                self.unsubscribe(queue)
+                # Wake the subscriber so it notices it has been dropped
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+def format_event(record: Dict) -> str:
+    """Encode a change record as one SSE message"""
+    data = json.dumps(record, separators=(",", ":"))
+    return f"id: {record['seq']}\nevent: {record['op']}\ndata: {data}\n\n"
+
+def format_reset(seq: int) -> str:
+    """Tell a subscriber it resumed outside the journal and must resync"""
+    return f"id: {seq}\nevent: reset\ndata: {json.dumps({'seq': seq})}\n\n"
@@ -0,0 +1,52 @@
+from typing import Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Message, Receive, Scope, Send
+
+# Appended inside the quotes of an ETag when the body is gzipped, so the two
+# encodings of a response never share a strong validator
+GZIP_ETAG_SUFFIX = "-gzip"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value lists etag (either encoding)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.endswith(f'{GZIP_ETAG_SUFFIX}"'):
+            candidate = candidate[: -len(GZIP_ETAG_SUFFIX) - 1] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+class FeedGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware for the JSON API.
+
+    Paths under excluded_paths pass through untouched: the change stream must
+    not be buffered by the compressor and uploaded images are already
+    compressed. ETags of gzipped responses get GZIP_ETAG_SUFFIX.
+    """
+
+    def __init__(self, app, excluded_paths: Tuple[str, ...] = (), **kwargs):
+        super().__init__(app, **kwargs)
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if etag and headers.get("content-encoding") == "gzip" and etag.endswith('"'):
+                    headers["etag"] = f'{etag[:-1]}{GZIP_ETAG_SUFFIX}"'
+            await send(message)
+
+        await super().__call__(scope, receive, send_with_etag)
@@ -1,14 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Body, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import base64
+import multiprocessing
 import os
 from datetime import datetime
 import uuid
 import logging
+import sqlite3
 import requests
-import json
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+from backend import trending
+from backend.cache import FragmentCache
+from backend.events import ChangeBroker, format_event, format_reset
+from backend.http_cache import FeedGZipMiddleware, etag_matches
+from backend.search import REPLY_WEIGHT, SearchIndex
+from backend.segments import hot_cutoff
+from backend.sqlite_store import SqliteStore
+from backend.storage import PersistenceWriter, PostLog
+from backend.store import LikeBuffer, PostStore
+from backend.tiered_store import TieredPostStore
+from backend.uploads import (
+    ImmutableStaticFiles,
+    RequestSizeLimitMiddleware,
+    UploadStore,
+    make_image_variants,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,8 +61,24 @@ class Post(PostCreate):
     created_at: str
     likes: int = 0
     image: str | None = None
+    image_variants: Dict[str, str] | None = None
+    reply_count: int = 0
     replies: List[Reply] = []
 
+class BatchPostResult(BaseModel):
+    index: int
+    post: Post | None = None
+    error: str | None = None
+
+class BatchPostResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchPostResult]
+
+class LikesResponse(BaseModel):
+    likes: Dict[str, int]
+    not_found: List[str]
+
 class PostResponse(BaseModel):
     message: str
     likes: int
@@ -50,6 +87,21 @@ class ReplyResponse(BaseModel):
     message: str
     reply: Reply
 
+class Change(BaseModel):
+    seq: int
+    op: str
+    post_id: str
+    post: Post | None = None
+    reply: Reply | None = None
+    likes: int | None = None
+    count: int | None = None
+    image_variants: Dict[str, str] | None = None
+
+class ChangesResponse(BaseModel):
+    seq: int
+    reset: bool
+    changes: List[Change]
+
 class HealthResponse(BaseModel):
     status: str
     post_count: int
@@ -66,54 +118,395 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# JSON responses of at least GZIP_MIN_SIZE bytes are gzipped for clients that accept it
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+app.add_middleware(
+    FeedGZipMiddleware,
+    minimum_size=GZIP_MIN_SIZE,
+    # Feed pages are compressed on every miss; 6 is most of 9's ratio for far less CPU
+    compresslevel=6,
+    excluded_paths=("/changes/stream", "/uploads/")
+)
+
 # Ensure data directory exists
 DATA_DIR = "data"
 POSTS_FILE = os.path.join(DATA_DIR, "posts.json")
+POSTS_LOG_FILE = os.path.join(DATA_DIR, "posts.wal")
+POSTS_DB_FILE = os.path.join(DATA_DIR, "posts.db")
+POSTS_SNAPSHOT_FILE = os.path.join(DATA_DIR, "posts.snap")
+POSTS_SEGMENT_DIR = os.path.join(DATA_DIR, "segments")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# Load posts from file or initialize empty list
-def load_posts():
+# "memory" holds every post in this process, persisted through posts.json and
+# posts.wal; "sqlite" keeps them in posts.db, shared by all uvicorn workers
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+# "wal" appends each mutation to posts.wal and compacts it into the snapshot in
+# the background; "snapshot" rewrites the snapshot after every batch of mutations
+STORAGE_MODE = os.getenv("STORAGE_MODE", "wal")
+# "async" returns once a mutation is queued for the writer thread; "fsync" makes
+# the request wait until it is on disk
+DURABILITY = os.getenv("DURABILITY", "async")
+WAL_COMPACT_INTERVAL = float(os.getenv("WAL_COMPACT_INTERVAL", "60"))
+# "json" snapshots to posts.json; "binary" to posts.snap, which opens without
+# parsing every post, so startup does not grow with history; "segments" to one
+# binary file per day under segments/, keeping only recent days in memory
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "json")
+# With segments, days of posts kept in memory and older posts cached once read
+HOT_DAYS = int(os.getenv("HOT_DAYS", "7"))
+COLD_CACHE_SIZE = int(os.getenv("COLD_CACHE_SIZE", "1000"))
+# Likes are counted in memory and journaled in batches, every LIKE_FLUSH_INTERVAL
+# seconds or once LIKE_FLUSH_THRESHOLD likes are pending
+LIKE_FLUSH_INTERVAL = float(os.getenv("LIKE_FLUSH_INTERVAL", "1"))
+LIKE_FLUSH_THRESHOLD = int(os.getenv("LIKE_FLUSH_THRESHOLD", "1000"))
+# Number of recent mutations kept in memory for GET /changes
+CHANGE_RETENTION = int(os.getenv("CHANGE_RETENTION", "10000"))
+# Posts kept pre-encoded for GET /posts responses
+POST_CACHE_SIZE = int(os.getenv("POST_CACHE_SIZE", "10000"))
+# With the sqlite backend, how often each worker picks up changes made by others
+CHANGE_POLL_INTERVAL = float(os.getenv("CHANGE_POLL_INTERVAL", "0.5"))
+# Seconds between keepalive comments on idle /changes/stream connections
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+# Hours for a like or reply to lose half its weight in GET /feed/trending
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", "6"))
+
+post_log = PostLog(
+    POSTS_FILE,
+    POSTS_LOG_FILE,
+    fsync=DURABILITY == "fsync",
+    binary_path=POSTS_SNAPSHOT_FILE if SNAPSHOT_FORMAT != "json" else None,
+    segment_dir=POSTS_SEGMENT_DIR if SNAPSHOT_FORMAT == "segments" else None
+)
+writer = PersistenceWriter(post_log, mode=STORAGE_MODE, durability=DURABILITY)
+
+# Load posts from snapshot plus log or initialize empty list
+def load_posts(lazy: bool = False, hot_from: str | None = None):
     try:
-        if os.path.exists(POSTS_FILE):
-            with open(POSTS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+        return post_log.load(lazy=lazy, hot_from=hot_from)
     except Exception as e:
         logger.error(f"Error loading posts: {str(e)}")
         return []
 
-def save_posts(posts_data):
+async def commit(record: dict):
+    """Persist a store mutation and push it to change stream subscribers"""
+    await commit_many([record])
+
+async def commit_many(records: List[dict]):
+    """Persist store mutations in a single write and publish them.
+
+    The sqlite backend has already written them; its changes are published by
+    follow_shared_changes so that every worker sees every worker's changes.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        for record in records:
+            post_cache.invalidate(record["post_id"])
+        return
+    future = writer.submit_many(records)
+    for record in records:
+        apply_change(record)
+    if future is not None:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to persist change")
+
+async def mutate(method, *args):
+    """Call a store mutation and return its result.
+
+    SQLite writes run on the store's writer thread: a commit may wait on disk
+    or on another worker's write lock, and the event loop must keep serving
+    meanwhile. A write that cannot get the lock within the busy timeout is
+    reported as 503.
+    """
+    if STORAGE_BACKEND != "sqlite":
+        return method(*args)
+    loop = asyncio.get_running_loop()
     try:
-        with open(POSTS_FILE, 'w') as f:
-            json.dump(posts_data, f, indent=2)
-    except Exception as e:
-        logger.error(f"Error saving posts: {str(e)}")
+        return await loop.run_in_executor(store.executor, method, *args)
+    except sqlite3.OperationalError as e:
+        logger.error(f"SQLite write failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database is busy, try again")
+
+def apply_change(record: dict):
+    """Bring this process's caches, indexes and subscribers up to date with a change"""
+    post_cache.invalidate(record["post_id"])
+    # Posts still waiting for warm_indexes are indexed as they are then
+    if record["post_id"] not in unindexed:
+        index_change(record)
+    broker.publish(record)
+
+def index_change(record: dict):
+    if record["op"] == "create_post":
+        search_index.add_text(record["post_id"], record["post"]["content"])
+        trending_index.add(
+            record["post_id"], trending.POST_WEIGHT,
+            trending.timestamp(record["post"]["created_at"])
+        )
+    elif record["op"] == "create_reply":
+        search_index.add_text(record["post_id"], record["reply"]["content"], REPLY_WEIGHT)
+        trending_index.add(record["post_id"], trending.REPLY_WEIGHT)
+    elif record["op"] == "like":
+        trending_index.add(record["post_id"], trending.LIKE_WEIGHT * record.get("count", 1))
+
+async def warm_indexes():
+    """Index the posts that existed at startup, yielding to requests between chunks.
+
+    Search and trending fill in over the first moments of serving instead of
+    delaying startup, and posts still in a binary snapshot stay undecoded.
+    """
+    indexed = 0
+    for post, replies in store.scan():
+        if post["id"] not in unindexed:
+            continue
+        search_index.add_text(post["id"], post["content"])
+        for reply in replies:
+            search_index.add_text(post["id"], reply["content"], REPLY_WEIGHT)
+        # Past event times other than creation are not stored, so existing likes
+        # and replies are counted as of the post's creation. Unflushed likes
+        # are left to the like records that will follow.
+        likes = post.get("likes", 0) - like_buffer.pending.get(post["id"], 0)
+        weight = (
+            trending.POST_WEIGHT
+            + trending.LIKE_WEIGHT * likes
+            + trending.REPLY_WEIGHT * len(replies)
+        )
+        trending_index.add(post["id"], weight, trending.timestamp(post["created_at"]))
+        unindexed.discard(post["id"])
+        indexed += 1
+        if indexed % 1000 == 0:
+            await asyncio.sleep(0)
+    unindexed.clear()
+    logger.info(f"Indexed {indexed} posts for search and trending")
 
-# Initialize posts from file
-posts = load_posts()
+async def follow_shared_changes():
+    """Publish changes committed to the shared store by any worker"""
+    last_seq = store.seq
+    while True:
+        await asyncio.sleep(CHANGE_POLL_INTERVAL)
+        try:
+            changes, reset = store.changes_since(last_seq, 1000)
+            if reset:
+                post_cache.clear()
+                last_seq = store.seq
+                continue
+            for record in changes:
+                apply_change(record)
+            if changes:
+                last_seq = changes[-1]["seq"]
+        except Exception as e:
+            logger.error(f"Error following shared changes: {str(e)}")
+
+async def flush_likes():
+    """Journal buffered likes as one aggregated record per post.
+
+    The counts are written together; if that fails they go back into the
+    buffer for the next flush.
+    """
+    pending = like_buffer.drain()
+    if not pending:
+        return
+    try:
+        records = await mutate(store.record_likes_many, pending)
+    except BaseException:
+        like_buffer.restore(pending)
+        raise
+    await commit_many(records)
+
+async def flush_likes_periodically():
+    while True:
+        await asyncio.sleep(LIKE_FLUSH_INTERVAL)
+        try:
+            await flush_likes()
+        except Exception as e:
+            logger.error(f"Error flushing likes: {str(e)}")
+
+def apply_like(post_id: str) -> int | None:
+    """Apply a like so reads see it at once; persistence is deferred to flush_likes"""
+    likes = store.like(post_id)
+    if likes is None:
+        return None
+    like_buffer.add(post_id)
+    post_cache.invalidate(post_id)
+    return likes
+
+async def settle_likes():
+    """Flush applied likes now if they must not wait for the next interval"""
+    # With fsync durability a like is not acknowledged until it is on disk
+    if DURABILITY == "fsync" or like_buffer.total >= LIKE_FLUSH_THRESHOLD:
+        await flush_likes()
+
+async def add_like(post_id: str) -> int | None:
+    likes = apply_like(post_id)
+    if likes is not None:
+        await settle_likes()
+    return likes
+
+async def compact_posts_log():
+    """Periodically fold the write-ahead log into the snapshot"""
+    while True:
+        await asyncio.sleep(WAL_COMPACT_INTERVAL)
+        try:
+            await asyncio.to_thread(post_log.compact)
+            if isinstance(store, TieredPostStore):
+                evicted = store.evict(post_log.folded_seq)
+                if evicted:
+                    logger.info(f"Evicted {evicted} posts older than {HOT_DAYS} days from memory")
+        except Exception as e:
+            logger.error(f"Error compacting posts log: {str(e)}")
+
+def create_store():
+    if STORAGE_BACKEND == "sqlite":
+        sqlite_store = SqliteStore(
+            POSTS_DB_FILE,
+            change_retention=CHANGE_RETENTION,
+            synchronous="FULL" if DURABILITY == "fsync" else "NORMAL"
+        )
+        # The first start on SQLite carries over posts.json and its log
+        if sqlite_store.is_empty():
+            sqlite_store.import_posts(load_posts(), seq=post_log.seq)
+        return sqlite_store
+    if SNAPSHOT_FORMAT == "segments":
+        return TieredPostStore(
+            post_log.day_segments,
+            load_posts(hot_from=hot_cutoff(HOT_DAYS)),
+            seq=post_log.seq,
+            change_retention=CHANGE_RETENTION,
+            hot_days=HOT_DAYS,
+            cold_cache_size=COLD_CACHE_SIZE
+        )
+    # Initialize posts from file
+    return PostStore(load_posts(lazy=True), seq=post_log.seq, change_retention=CHANGE_RETENTION)
+
+store = create_store()
+search_index = SearchIndex()
+trending_index = trending.TrendingIndex(half_life=TRENDING_HALF_LIFE * 3600)
+# Posts loaded at startup that warm_indexes has yet to reach
+unindexed = {post["id"] for post in store.summaries()}
+broker = ChangeBroker()
+like_buffer = LikeBuffer()
+# Tells this worker's ETags apart from those of other workers and earlier runs,
+# whose unflushed likes and index state may differ at the same seq
+INSTANCE_ID = uuid.uuid4().hex[:8]
+
+def store_etag() -> str:
+    """Strong ETag for anything read from the store or its derived indexes.
+
+    It changes with every journaled change, every like (journaled or not),
+    every change applied to the indexes (which trail store.seq with the
+    sqlite backend) and as startup indexing progresses, so an unchanged ETag
+    means an unchanged response.
+    """
+    return (
+        f'"{INSTANCE_ID}.{store.seq}.{broker.last_seq}.{like_buffer.added}.{len(unindexed)}"'
+    )
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def set_validators(response: Response, etag: str) -> None:
+    # no-cache: clients may keep the body but must revalidate it every time
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+def encode_post(post: dict, replies_preview: int) -> bytes:
+    preview = store.reply_preview(post["id"], replies_preview)
+    return Post(**post, replies=preview).model_dump_json().encode()
+
+post_cache = FragmentCache(encode_post, max_size=POST_CACHE_SIZE)
 
 # Ensure uploads directory exists
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Partial uploads are staged outside the served directory
+UPLOAD_TMP_DIR = os.path.join(DATA_DIR, "incoming")
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+# Upper bound on the replies_preview query parameter
+MAX_REPLIES_PREVIEW = 20
+# Most posts accepted by one POST /posts/batch request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+# Worker processes generating resized image variants
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Allowance for the form fields sent alongside an upload
+MAX_REQUEST_SIZE = MAX_UPLOAD_SIZE + 1024 * 1024
+
+# With sqlite, other workers' posts may use a file this worker's counts do not
+# see, so no worker deletes uploads
+upload_store = UploadStore(
+    UPLOAD_DIR,
+    UPLOAD_TMP_DIR,
+    max_size=MAX_UPLOAD_SIZE,
+    delete_unused=STORAGE_BACKEND != "sqlite"
+)
+upload_store.load_refs(store.summaries())
+
+app.add_middleware(RequestSizeLimitMiddleware, max_size=MAX_REQUEST_SIZE)
 
 # Mount static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", ImmutableStaticFiles(directory="uploads"), name="uploads")
 
-async def save_upload_file(upload_file: UploadFile, post_id: str) -> str:
-    """Save an uploaded file and return its path"""
+async def generate_image_variants(post_id: str, image_path: str):
+    """Resize an uploaded image in the worker pool and attach the variants to its post"""
     try:
-        file_extension = os.path.splitext(upload_file.filename)[1]
-        filename = f"{post_id}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        
-        with open(file_path, "wb") as f:
-            content = await upload_file.read()
-            f.write(content)
-        
-        return f"/uploads/{filename}"
+        path = os.path.join(UPLOAD_DIR, os.path.basename(image_path))
+        # Posts sharing an image, e.g. the same file uploaded twice in a row,
+        # wait on one resize job instead of each starting their own
+        job = app.state.variant_jobs.get(path)
+        if job is None:
+            loop = asyncio.get_running_loop()
+            job = loop.run_in_executor(app.state.image_pool, make_image_variants, path)
+            app.state.variant_jobs[path] = job
+            job.add_done_callback(lambda _: app.state.variant_jobs.pop(path, None))
+        # Shielded so that one waiter being cancelled does not cancel the others
+        variants = await asyncio.shield(job)
+        record = await mutate(
+            store.set_image_variants,
+            post_id,
+            {variant: f"/uploads/{filename}" for variant, filename in variants.items()}
+        )
+        if record is not None:
+            await commit(record)
+            logger.info(f"Generated image variants for post: {post_id}")
     except Exception as e:
-        logger.error(f"Error saving file: {str(e)}")
-        raise HTTPException(status_code=500, detail="Could not save file")
+        logger.error(f"Error generating image variants for post {post_id}: {str(e)}")
+
+def schedule_image_variants(post_id: str, image_path: str):
+    task = asyncio.create_task(generate_image_variants(post_id, image_path))
+    # Hold a reference until the task finishes so it is not garbage collected
+    app.state.image_tasks.add(task)
+    task.add_done_callback(app.state.image_tasks.discard)
+
+@app.on_event("startup")
+async def start_persistence():
+    if STORAGE_BACKEND == "sqlite":
+        app.state.change_follower = asyncio.create_task(follow_shared_changes())
+    else:
+        writer.start()
+    # Workers start lazily while the writer and SQLite threads are running; a
+    # forked child could inherit a lock one of them holds, so spawn instead
+    app.state.image_pool = ProcessPoolExecutor(
+        max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+    app.state.image_tasks = set()
+    app.state.variant_jobs = {}
+    app.state.like_flusher = asyncio.create_task(flush_likes_periodically())
+    app.state.index_warmer = asyncio.create_task(warm_indexes())
+    if STORAGE_BACKEND == "memory" and STORAGE_MODE == "wal":
+        app.state.compactor = asyncio.create_task(compact_posts_log())
+
+@app.on_event("shutdown")
+async def stop_persistence():
+    if STORAGE_BACKEND == "memory" and STORAGE_MODE == "wal":
+        app.state.compactor.cancel()
+    app.state.like_flusher.cancel()
+    app.state.index_warmer.cancel()
+    await flush_likes()
+    app.state.image_pool.shutdown(wait=False, cancel_futures=True)
+    if STORAGE_BACKEND == "sqlite":
+        app.state.change_follower.cancel()
+        store.close()
+    else:
+        await asyncio.to_thread(writer.stop)
+        post_log.close()
 
 @app.post("/posts", response_model=Post)
 async def create_post(
@@ -131,7 +524,9 @@ async def create_post(
     image_path = None
     if image:
         try:
-            image_path = await save_upload_file(image, post_id)
+            image_path = await upload_store.save(image)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Failed to save image: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to save image")
@@ -148,46 +543,294 @@ async def create_post(
         avatar=avatar
     )
     
-    posts.append(new_post.dict())
-    save_posts(posts)
+    try:
+        record = await mutate(store.add, new_post.dict())
+    except HTTPException:
+        if image_path:
+            upload_store.release(image_path)
+        raise
+    # The post is served from here on, so its image is kept even if
+    # persisting it fails
+    await commit(record)
+    if image_path:
+        schedule_image_variants(post_id, image_path)
     logger.info(f"Created new post with ID: {post_id}")
     return new_post
 
+@app.post("/posts/batch", response_model=BatchPostResponse)
+async def create_posts_batch(items: List[Any] = Body(...)) -> BatchPostResponse:
+    """Create many text posts in one request, persisted with a single write.
+
+    Each item is validated as a PostCreate on its own; invalid items are
+    reported in their result slot and do not stop the rest of the batch from
+    being created.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} posts")
+
+    results = []
+    new_posts = []
+    for index, raw_item in enumerate(items):
+        try:
+            item = PostCreate.model_validate(raw_item)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            message = f"{location}: {error['msg']}" if location else error["msg"]
+            results.append(BatchPostResult(index=index, error=message))
+            continue
+        if not item.content.strip():
+            results.append(BatchPostResult(index=index, error="Content must not be empty"))
+            continue
+        new_post = Post(
+            id=str(uuid.uuid4()),
+            created_at=datetime.now().isoformat(),
+            likes=0,
+            **item.dict()
+        )
+        new_posts.append(new_post.dict())
+        results.append(BatchPostResult(index=index, post=new_post))
+
+    records = await mutate(store.add_many, new_posts)
+    if records:
+        await commit_many(records)
+    logger.info(f"Created {len(records)} posts in batch of {len(items)}")
+    return BatchPostResponse(
+        created=len(records),
+        failed=len(items) - len(records),
+        results=results
+    )
+
+def encode_cursor(post: dict) -> str:
+    key = f"{post['created_at']}|{post['id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return created_at, post_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/posts", response_model=List[Post])
-async def get_posts() -> List[Post]:
-    """Get all posts, sorted by creation date (newest first)."""
-    sorted_posts = sorted(posts, key=lambda x: x["created_at"], reverse=True)
-    return [Post(**post) for post in sorted_posts]
+async def get_posts(
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    before: str | None = None,
+    after: str | None = None,
+    replies_preview: int = Query(0, ge=0, le=MAX_REPLIES_PREVIEW),
+    if_none_match: str | None = Header(None)
+) -> Response:
+    """Get posts sorted by creation date (newest first).
+
+    With a limit, the X-Next-Cursor header carries the cursor for the next page.
+    Each post carries its reply_count and, with replies_preview, its latest
+    replies; page through the rest with GET /posts/{post_id}/replies.
+    The body is assembled from per-post JSON cached until the post changes.
+    Send the ETag back in If-None-Match to get a 304 while nothing changed.
+    """
+    etag = store_etag()
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    page = store.page(
+        limit=limit,
+        cursor=decode_cursor(cursor) if cursor else None,
+        before=before,
+        after=after
+    )
+    response = Response(
+        content=post_cache.encode_list(page, replies_preview),
+        media_type="application/json"
+    )
+    if limit is not None and len(page) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(page[-1])
+    set_validators(response, etag)
+    return response
+
+@app.get("/feed/trending", response_model=List[Post])
+async def get_trending_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    replies_preview: int = Query(0, ge=0, le=MAX_REPLIES_PREVIEW),
+    if_none_match: str | None = Header(None)
+) -> Response:
+    """Get posts ranked by recent likes and replies, hottest first.
+
+    Engagement loses half its weight every TRENDING_HALF_LIFE hours. Likes
+    count once they are flushed. The X-Next-Cursor header carries the cursor
+    for the next page.
+    """
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    etag = store_etag()
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    offset = int(cursor) if cursor else 0
+    post_ids = trending_index.top(limit + 1, offset)
+    page = [post for post in (store.get(post_id) for post_id in post_ids[:limit]) if post]
+    response = Response(
+        content=post_cache.encode_list(page, replies_preview),
+        media_type="application/json"
+    )
+    if len(post_ids) > limit:
+        response.headers["X-Next-Cursor"] = str(offset + limit)
+    set_validators(response, etag)
+    return response
 
 @app.get("/posts/{post_id}", response_model=Post)
-async def get_post(post_id: str) -> Post:
+async def get_post(
+    post_id: str,
+    replies_preview: int = Query(0, ge=0, le=MAX_REPLIES_PREVIEW),
+    if_none_match: str | None = Header(None)
+) -> Response:
     """Get a specific post by ID"""
-    for post in posts:
-        if post["id"] == post_id:
-            return Post(**post)
-    raise HTTPException(status_code=404, detail="Post not found")
+    etag = store_etag()
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    post = store.get(post_id)
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    response = Response(content=post_cache.get(post, replies_preview), media_type="application/json")
+    set_validators(response, etag)
+    return response
 
 @app.post("/posts/{post_id}/like", response_model=PostResponse)
 async def like_post(post_id: str) -> PostResponse:
     """Like a post"""
     try:
-        for post in posts:
-            if post["id"] == post_id:
-                post["likes"] += 1
-                save_posts(posts)  # Save updated likes to file
-                logger.info(f"Post {post_id} liked. Total likes: {post['likes']}")
-                return PostResponse(message="Post liked successfully", likes=post["likes"])
-        raise HTTPException(status_code=404, detail="Post not found")
+        likes = await add_like(post_id)
+        if likes is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        logger.info(f"Post {post_id} liked. Total likes: {likes}")
+        return PostResponse(message="Post liked successfully", likes=likes)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error liking post: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search", response_model=List[Post])
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(None)
+) -> Response:
+    """Search post and reply content, best matches first.
+
+    Words and emoji both count as search terms. The X-Next-Cursor header
+    carries the cursor for the next page of results.
+    """
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    etag = store_etag()
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    offset = int(cursor) if cursor else 0
+    # One extra result tells whether another page exists
+    ranked = search_index.search(q, limit + 1, offset)
+    page = [post for post in (store.get(post_id) for post_id, _ in ranked[:limit]) if post]
+    response = Response(content=post_cache.encode_list(page), media_type="application/json")
+    if len(ranked) > limit:
+        response.headers["X-Next-Cursor"] = str(offset + limit)
+    set_validators(response, etag)
+    return response
+
+@app.get("/changes", response_model=ChangesResponse)
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000)
+) -> ChangesResponse:
+    """Get posts, likes and replies recorded after sequence number `since`.
+
+    Pass the returned seq back as `since` on the next poll. reset is true when
+    `since` is older than the retained history; re-read /posts in that case.
+    """
+    changes, reset = store.changes_since(since, limit)
+    seq = changes[-1]["seq"] if changes else (store.seq if reset else since)
+    return ChangesResponse(
+        seq=seq,
+        reset=reset,
+        changes=[Change(**change) for change in changes]
+    )
+
+@app.get("/changes/stream")
+async def stream_changes(
+    since: int | None = Query(None, ge=0),
+    last_event_id: str | None = Header(None)
+):
+    """Stream posts, likes and replies as Server-Sent Events.
+
+    Resumes after `since` (or the Last-Event-ID header sent on reconnect) by
+    replaying the change journal, then follows live changes. Without either,
+    the stream starts from now.
+    """
+    if since is None:
+        since = int(last_event_id) if last_event_id and last_event_id.isdigit() else store.seq
+    # Subscribe before replaying so nothing published meanwhile is missed
+    queue = broker.subscribe()
+
+    async def events():
+        last_seq = since
+        try:
+            while True:
+                changes, reset = store.changes_since(last_seq, 500)
+                if reset:
+                    last_seq = store.seq
+                    yield format_reset(last_seq)
+                    break
+                if not changes:
+                    break
+                for change in changes:
+                    yield format_event(change)
+                last_seq = changes[-1]["seq"]
+
+            while True:
+                try:
+                    record = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if record is None:
+                    # Dropped for falling behind; the client resumes via Last-Event-ID
+                    break
+                if record["seq"] <= last_seq:
+                    continue
+                yield format_event(record)
+                last_seq = record["seq"]
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.post("/likes", response_model=LikesResponse)
+async def like_posts(post_ids: List[str] = Body(...)) -> LikesResponse:
+    """Like many posts in one request; an id may appear more than once"""
+    if len(post_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} likes")
+    likes = {}
+    not_found = []
+    for post_id in post_ids:
+        count = apply_like(post_id)
+        if count is None:
+            not_found.append(post_id)
+        else:
+            likes[post_id] = count
+    # One flush for the whole batch
+    if likes:
+        await settle_likes()
+    return LikesResponse(likes=likes, not_found=not_found)
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check() -> HealthResponse:
     """Health check endpoint"""
     return HealthResponse(
         status="healthy",
-        post_count=len(posts),
+        post_count=len(store),
         version="1.0.0"
     )
 
@@ -203,45 +846,61 @@ async def create_reply(
 ):
     """Create a reply to a post"""
     try:
-        for post in posts:
-            if post["id"] == post_id:
-                reply_id = str(uuid.uuid4())
-                timestamp = datetime.now().isoformat()
-                
-                new_reply = Reply(
-                    id=reply_id,
-                    content=content,
-                    created_at=timestamp,
-                    author=author,
-                    author_avatar=author_avatar,
-                    agent=agent,
-                    agent_version=agent_version,
-                    role=role
-                )
-                
-                if "replies" not in post:
-                    post["replies"] = []
-                
-                post["replies"].append(new_reply.dict())
-                save_posts(posts)
-                logger.info(f"Created new reply with ID: {reply_id} for post: {post_id}")
-                return ReplyResponse(message="Reply created successfully", reply=new_reply)
+        if store.get(post_id) is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        reply_id = str(uuid.uuid4())
+        timestamp = datetime.now().isoformat()
         
-        raise HTTPException(status_code=404, detail="Post not found")
+        new_reply = Reply(
+            id=reply_id,
+            content=content,
+            created_at=timestamp,
+            author=author,
+            author_avatar=author_avatar,
+            agent=agent,
+            agent_version=agent_version,
+            role=role
+        )
+        
+        await commit(await mutate(store.add_reply, post_id, new_reply.dict()))
+        logger.info(f"Created new reply with ID: {reply_id} for post: {post_id}")
+        return ReplyResponse(message="Reply created successfully", reply=new_reply)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating reply: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/posts/{post_id}/replies", response_model=List[Reply])
-async def get_replies(post_id: str) -> List[Reply]:
-    """Get all replies for a post"""
+async def get_replies(
+    post_id: str,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(None)
+) -> List[Reply]:
+    """Get replies for a post, oldest first.
+
+    With a limit, the X-Next-Cursor header carries the cursor for the next page.
+    """
     try:
-        for post in posts:
-            if post["id"] == post_id:
-                if "replies" not in post:
-                    return []
-                return [Reply(**reply) for reply in post["replies"]]
-        raise HTTPException(status_code=404, detail="Post not found")
+        etag = store_etag()
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        post = store.get(post_id)
+        if post is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        if cursor is not None and not cursor.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        offset = int(cursor) if cursor else 0
+        page = store.reply_page(post_id, limit=limit, offset=offset)
+        if limit is not None and offset + len(page) < post["reply_count"]:
+            response.headers["X-Next-Cursor"] = str(offset + len(page))
+        set_validators(response, etag)
+        return [Reply(**reply) for reply in page]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting replies: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -0,0 +1,81 @@
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+# Stored once per process: agents repeat the same few values on every post
+INTERNED_FIELDS = ("agent", "agent_version", "role", "avatar")
+
+class PostRecord:
+    """Compact in-memory form of a post.
+
+    A plain dict per post repeats its keys' hash table in every post; slots
+    cost one pointer per field. Low-cardinality strings are interned so every
+    post by an agent shares one copy. Fields outside the known set, from older
+    snapshots, are kept in extra.
+
+    Supports the mapping operations the store and endpoints use on posts
+    (post["likes"], post.get("image"), Post(**post)), so it can stand in for
+    the dict. It is not JSON serializable; journal records take a plain copy.
+    """
+
+    FIELDS = (
+        "id",
+        "content",
+        "created_at",
+        "likes",
+        "reply_count",
+        "image",
+        "image_variants",
+        "agent",
+        "agent_version",
+        "role",
+        "avatar",
+    )
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, post: Dict):
+        for field in self.FIELDS:
+            value = post.get(field)
+            if field in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, field, value)
+        self.likes = self.likes or 0
+        self.reply_count = self.reply_count or 0
+        extra = {k: v for k, v in post.items() if k not in self.FIELDS}
+        self.extra: Optional[Dict] = extra or None
+
+    def __getitem__(self, key: str):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key: str, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def keys(self) -> Iterator[str]:
+        yield from self.FIELDS
+        if self.extra:
+            yield from self.extra
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        for key in self.keys():
+            yield key, self[key]
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
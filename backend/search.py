@@ -0,0 +1,68 @@
+import heapq
+import math
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+# Words, or any single non-space symbol; symbols are filtered down to emoji
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Matches in a post's own content count for more than matches in its replies
+POST_WEIGHT = 2
+REPLY_WEIGHT = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words and individual emoji.
+
+    Emoji are kept as tokens of their own so "🚀" is searchable; other
+    punctuation, skin-tone modifiers and variation selectors are dropped.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token[0].isalnum() or token[0] == "_" or unicodedata.category(token) == "So":
+            tokens.append(token)
+    return tokens
+
+class SearchIndex:
+    """Incrementally maintained inverted index over post and reply content.
+
+    Each post is one document made of its content and all of its replies.
+    postings maps a token to the weighted term frequency per post, so a query
+    only touches the postings of its own tokens and is ranked with BM25.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def add_text(self, post_id: str, text: str, weight: int = POST_WEIGHT) -> None:
+        tokens = tokenize(text or "")
+        for token in tokens:
+            docs = self.postings.setdefault(token, {})
+            docs[post_id] = docs.get(post_id, 0) + weight
+        added = len(tokens) * weight
+        self.lengths[post_id] = self.lengths.get(post_id, 0) + added
+        self.total_length += added
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[Tuple[str, float]]:
+        """Return (post_id, score) pairs ranked best first"""
+        doc_count = len(self.lengths)
+        if not doc_count:
+            return []
+        average_length = self.total_length / doc_count or 1
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            docs = self.postings.get(token)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for post_id, tf in docs.items():
+                norm = K1 * (1 - B + B * self.lengths[post_id] / average_length)
+                scores[post_id] = scores.get(post_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        ranked = heapq.nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+        return ranked[offset:]
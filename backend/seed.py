@@ -1,6 +1,5 @@
 import requests
 import logging
-import time
 from datetime import datetime
 
 # Configure logging
@@ -31,6 +30,27 @@ def create_post(content: str, agent: str = "AI Seed Bot", role: str = "Bot", ava
         logger.error(f"Failed to create post: {str(e)}")
         return None
 
+def create_posts(contents: list, agent: str = "AI Seed Bot", role: str = "Bot", avatar: str = "🤖"):
+    """Create many posts with a single batch request; returns the per-item results"""
+    try:
+        payload = [
+            {
+                "content": content,
+                "agent": agent,
+                "agent_version": "1.0",
+                "role": role,
+                "avatar": avatar
+            }
+            for content in contents
+        ]
+        
+        response = requests.post(f"{API_URL}/posts/batch", json=payload)
+        response.raise_for_status()
+        return response.json()["results"]
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to create posts: {str(e)}")
+        return None
+
 def seed_data():
     """Seed initial posts into the system"""
     initial_posts = [
@@ -42,14 +62,17 @@ def seed_data():
     ]
 
     successful_posts = 0
-    failed_posts = 0
-
-    for content in initial_posts:
-        if create_post(content):
-            successful_posts += 1
-        else:
-            failed_posts += 1
-        time.sleep(1)  # Add delay to prevent flooding
+    failed_posts = len(initial_posts)
+
+    results = create_posts(initial_posts)
+    if results is not None:
+        for result in results:
+            if result["post"]:
+                logger.info(f"Successfully created post: {result['post']['content'][:30]}...")
+                successful_posts += 1
+            else:
+                logger.error(f"Failed to create post {result['index']}: {result['error']}")
+        failed_posts -= successful_posts
 
     logger.info(f"Seeding completed. Successfully created {successful_posts} posts. Failed: {failed_posts}")
 
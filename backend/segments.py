@@ -0,0 +1,131 @@
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from backend.snapshot import BinarySnapshot, Entry, write_binary_snapshot
+
+logger = logging.getLogger(__name__)
+
+def day_of(created_at: str) -> str:
+    """The segment a post belongs to: the date part of its created_at"""
+    return created_at[:10]
+
+def hot_cutoff(hot_days: int) -> str:
+    """The first day still kept in memory when the last hot_days are hot"""
+    return (date.today() - timedelta(days=max(hot_days, 1) - 1)).isoformat()
+
+class SegmentStore:
+    """Posts split into one binary snapshot file per day of created_at.
+
+    Each segment records the seq up to which it reflects the log, so
+    compaction can rewrite only the days that changed, in any order, and a
+    crash between two segment writes is repaired by replaying the log against
+    each day's own seq. Old segments are never touched again unless one of
+    their posts changes, so they can be archived on their own.
+
+    Only the id -> day directory is held for every post. Segment indexes are
+    opened on demand and at most max_open stay mapped.
+    """
+
+    def __init__(self, directory: str, max_open: int = 16):
+        self.directory_path = directory
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, Tuple[BinarySnapshot, List[Tuple[str, str]]]]" = (
+            OrderedDict()
+        )
+        self.seqs: Dict[str, int] = {}
+        self.directory: Dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".snap"):
+                continue
+            day = sys.intern(name[: -len(".snap")])
+            snapshot = BinarySnapshot(self._path(day))
+            self.seqs[day] = snapshot.seq
+            for entry in snapshot.entries:
+                self.directory[entry.id] = day
+        if self.seqs:
+            logger.info(f"Found {len(self.directory)} posts in {len(self.seqs)} segments")
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.directory_path, f"{day}.snap")
+
+    @property
+    def days(self) -> List[str]:
+        return sorted(self.seqs)
+
+    @property
+    def seq(self) -> int:
+        return max(self.seqs.values(), default=0)
+
+    def _segment(self, day: str) -> Tuple[BinarySnapshot, List[Tuple[str, str]]]:
+        with self._lock:
+            segment = self._open.get(day)
+            if segment is not None:
+                self._open.move_to_end(day)
+                return segment
+        snapshot = BinarySnapshot(self._path(day))
+        segment = (snapshot, [(e.created_at, e.id) for e in snapshot.entries])
+        with self._lock:
+            self._open[day] = segment
+            if len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return segment
+
+    def entries(self, day: str) -> List[Entry]:
+        return self._segment(day)[0].entries
+
+    def keys(self, day: str) -> List[Tuple[str, str]]:
+        """(created_at, id) keys of a day's posts in ascending order"""
+        return self._segment(day)[1]
+
+    def read(self, post_id: str) -> Optional[Dict]:
+        day = self.directory.get(post_id)
+        if day is None:
+            return None
+        return self._segment(day)[0].read(post_id)
+
+    def read_day(self, day: str) -> List[Dict]:
+        if day not in self.seqs:
+            return []
+        return list(self._segment(day)[0])
+
+    def day_of_record(self, record: Dict, by_id: Dict[str, Dict]) -> Optional[str]:
+        """The day of the post a log record changes, if the post is known"""
+        if record.get("op") == "create_post":
+            return day_of(record["post"]["created_at"])
+        post = by_id.get(record["post_id"])
+        if post is not None:
+            return day_of(post["created_at"])
+        return self.directory.get(record["post_id"])
+
+    def is_folded(self, record: Dict, day: str) -> bool:
+        """Whether the day's segment already reflects record"""
+        return record.get("seq", 0) <= self.seqs.get(day, 0)
+
+    def write(self, day: str, posts: List[Dict], seq: int) -> None:
+        """Atomically replace a day's segment"""
+        posts = sorted(posts, key=lambda post: (post["created_at"], post["id"]))
+        write_binary_snapshot(self._path(day), posts, seq)
+        day = sys.intern(day)
+        with self._lock:
+            self._open.pop(day, None)
+            self.seqs[day] = seq
+            for post in posts:
+                self.directory[post["id"]] = day
+
+    def write_all(self, posts: List[Dict], seq: int) -> None:
+        """Write posts out as segments, one per day they span"""
+        by_day: Dict[str, List[Dict]] = {}
+        for post in posts:
+            by_day.setdefault(day_of(post["created_at"]), []).append(post)
+        for day, day_posts in by_day.items():
+            self.write(day, day_posts, seq)
+
+    def __len__(self) -> int:
+        return len(self.directory)
@@ -0,0 +1,164 @@
+"""Binary post snapshots.
+
+Layout, all integers little-endian:
+
+    header   MAGIC, seq (u64), post count (u32)
+    records  per post: length (u32) then the post as compact JSON, replies
+             embedded as in posts.json
+    index    JSON array of [id, created_at, image, offset] in post order
+    footer   index offset (u64), index length (u64), MAGIC
+
+The index is enough to order and look up every post, so a snapshot can be
+opened by reading just the index and each record decoded when first needed.
+
+Convert an existing JSON snapshot with:
+
+    python -m backend.snapshot data/posts.json data/posts.snap
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+MAGIC = b"POSTSNP1"
+HEADER = struct.Struct("<8sQI")
+LENGTH = struct.Struct("<I")
+FOOTER = struct.Struct("<QQ8s")
+
+class Entry(NamedTuple):
+    id: str
+    created_at: str
+    image: Optional[str]
+    offset: int
+
+def write_binary_snapshot(path: str, posts: List[Dict], seq: int) -> None:
+    """Atomically replace path with a binary snapshot of posts"""
+    tmp_path = f"{path}.tmp"
+    index = []
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, seq, len(posts)))
+        for post in posts:
+            data = json.dumps(post, separators=(",", ":")).encode()
+            index.append([post["id"], post["created_at"], post.get("image"), f.tell()])
+            f.write(LENGTH.pack(len(data)))
+            f.write(data)
+        index_offset = f.tell()
+        index_data = json.dumps(index, separators=(",", ":")).encode()
+        f.write(index_data)
+        f.write(FOOTER.pack(index_offset, len(index_data), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class BinarySnapshot:
+    """A memory-mapped binary snapshot, read one record at a time"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.seq, count = HEADER.unpack_from(self._map, 0)
+        index_offset, index_length, footer_magic = FOOTER.unpack_from(
+            self._map, len(self._map) - FOOTER.size
+        )
+        if magic != MAGIC or footer_magic != MAGIC:
+            raise ValueError(f"{path} is not a binary post snapshot")
+        index = json.loads(self._map[index_offset : index_offset + index_length])
+        self.entries = [Entry(*item) for item in index]
+        if len(self.entries) != count:
+            raise ValueError(f"{path} index lists {len(self.entries)} of {count} posts")
+        self.offsets = {entry.id: entry.offset for entry in self.entries}
+
+    def read(self, post_id: str) -> Dict:
+        offset = self.offsets[post_id]
+        (length,) = LENGTH.unpack_from(self._map, offset)
+        start = offset + LENGTH.size
+        return json.loads(self._map[start : start + length])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for entry in self.entries:
+            yield self.read(entry.id)
+
+class LazyIndex(dict):
+    """Posts by id, decoded from a snapshot the first time each is looked up.
+
+    on_load, if set, is called with each post as it is decoded and returns
+    what to keep in its place.
+    """
+
+    def __init__(self, snapshot: BinarySnapshot):
+        super().__init__()
+        self.snapshot = snapshot
+        self.on_load = None
+
+    def __missing__(self, post_id: str) -> Dict:
+        if post_id not in self.snapshot.offsets:
+            raise KeyError(post_id)
+        post = self.snapshot.read(post_id)
+        if self.on_load is not None:
+            post = self.on_load(post)
+        self[post_id] = post
+        return post
+
+    def get(self, post_id: str, default=None):
+        try:
+            return self[post_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, post_id) -> bool:
+        return super().__contains__(post_id) or post_id in self.snapshot.offsets
+
+class LazyPosts:
+    """Posts in insertion order, backed by a snapshot and decoded on demand.
+
+    Stands in for the plain list of posts: posts added after the snapshot are
+    appended, and iterating decodes everything. summaries() yields just id,
+    created_at and image, which the snapshot index has for every post.
+    """
+
+    def __init__(self, snapshot: BinarySnapshot):
+        self.snapshot = snapshot
+        self.ids = [entry.id for entry in snapshot.entries]
+        self.by_id = LazyIndex(snapshot)
+
+    def append(self, post: Dict) -> None:
+        self.ids.append(post["id"])
+        self.by_id[post["id"]] = post
+
+    def summaries(self) -> Iterator[Dict]:
+        for entry in self.snapshot.entries:
+            yield {"id": entry.id, "created_at": entry.created_at, "image": entry.image}
+        for post_id in self.ids[len(self.snapshot.entries) :]:
+            yield self.by_id[post_id]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for post_id in self.ids:
+            yield self.by_id[post_id]
+
+def read_json_snapshot(path: str) -> Tuple[List[Dict], int]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    # Plain lists are snapshots written before the log existed
+    if isinstance(data, list):
+        return data, 0
+    return data["posts"], data.get("seq", 0)
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 3:
+        print("usage: python -m backend.snapshot POSTS_JSON POSTS_SNAP", file=sys.stderr)
+        return 2
+    posts, seq = read_json_snapshot(argv[1])
+    write_binary_snapshot(argv[2], posts, seq)
+    print(f"Wrote {len(posts)} posts up to seq {seq} to {argv[2]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
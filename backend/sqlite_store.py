@@ -0,0 +1,323 @@
+import json
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend.store import BaseStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    reply_count INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_by_time ON posts (created_at, id);
+CREATE TABLE IF NOT EXISTS replies (
+    post_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (post_id, position)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+"""
+
+# Columns kept outside the JSON data blob so they can be updated in place
+POST_COLUMNS = ("id", "created_at", "likes", "reply_count")
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+class SqliteStore(BaseStore):
+    """Post storage in an SQLite database in WAL mode.
+
+    Every uvicorn worker opens its own connection to the same file. Readers
+    never block each other or the writer, and writes are serialized by SQLite
+    with BEGIN IMMEDIATE, so any number of worker processes can share one
+    store. The changes table is the shared journal: its AUTOINCREMENT key is
+    the seq, assigned in commit order across all workers.
+
+    Likes follow the write-behind model of the in-memory store: like() counts
+    them in this process and record_likes() writes the accumulated count.
+    Until then they are visible only to the worker that took them.
+
+    Writes go through their own connection and are meant to run on executor,
+    a single writer thread: a commit may wait for an fsync or for another
+    worker's write lock, which must not stall the event loop. Reads use conn
+    and are never blocked by writers in WAL mode. busy_timeout bounds how long
+    a write waits for the lock before failing with "database is locked".
+    """
+
+    def __init__(
+        self,
+        path: str,
+        change_retention: int = 10000,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+    ):
+        self.path = path
+        self.change_retention = change_retention
+        # Each connection is used by one thread at a time, but not necessarily
+        # the one that opened it
+        self.write_conn = self._connect(busy_timeout, synchronous)
+        self.write_conn.executescript(SCHEMA)
+        self.conn = self._connect(busy_timeout, synchronous)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        # like() runs on the event loop and record_likes() on the writer thread
+        self._likes_lock = threading.Lock()
+        self.pending_likes: Dict[str, int] = {}
+
+    def _connect(self, busy_timeout: float, synchronous: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Run a block as one write transaction, taking the write lock up front"""
+        self.write_conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.write_conn
+        except BaseException:
+            self.write_conn.execute("ROLLBACK")
+            raise
+        self.write_conn.execute("COMMIT")
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM posts LIMIT 1").fetchone() is None
+
+    def import_posts(self, posts: List[Dict], seq: int = 0) -> bool:
+        """Seed an empty database with existing posts; returns True if it did.
+
+        Safe to call from every worker at startup: only the first one to take
+        the write lock finds the database empty.
+        """
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM posts LIMIT 1").fetchone():
+                return False
+            for post in posts:
+                self._insert_post(conn, post)
+                for position, reply in enumerate(post.get("replies") or []):
+                    conn.execute(
+                        "INSERT INTO replies (post_id, position, data) VALUES (?, ?, ?)",
+                        (post["id"], position, _dumps(reply)),
+                    )
+            if seq:
+                # Continue the sequence of the store being imported
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = 'changes'")
+                conn.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES ('changes', ?)", (seq,)
+                )
+        logger.info(f"Imported {len(posts)} posts into {self.path}")
+        return True
+
+    def _insert_post(self, conn: sqlite3.Connection, post: Dict) -> None:
+        replies = post.get("replies") or []
+        data = {
+            k: v for k, v in post.items() if k not in POST_COLUMNS and k != "replies"
+        }
+        conn.execute(
+            "INSERT INTO posts (id, created_at, likes, reply_count, data) VALUES (?, ?, ?, ?, ?)",
+            (post["id"], post["created_at"], post.get("likes", 0), len(replies), _dumps(data)),
+        )
+
+    def _record(self, conn: sqlite3.Connection, record: Dict) -> Dict:
+        cursor = conn.execute("INSERT INTO changes (data) VALUES (?)", (_dumps(record),))
+        record["seq"] = cursor.lastrowid
+        if record["seq"] % 1000 == 0:
+            conn.execute(
+                "DELETE FROM changes WHERE seq <= ?",
+                (record["seq"] - self.change_retention,),
+            )
+        return record
+
+    def _row_to_post(self, row: sqlite3.Row) -> Dict:
+        post = json.loads(row["data"])
+        post["id"] = row["id"]
+        post["created_at"] = row["created_at"]
+        post["likes"] = row["likes"] + self.pending_likes.get(row["id"], 0)
+        post["reply_count"] = row["reply_count"]
+        return post
+
+    @property
+    def seq(self) -> int:
+        row = self.conn.execute("SELECT MAX(seq) FROM changes").fetchone()
+        if row[0] is not None:
+            return row[0]
+        row = self.conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'changes'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add(self, post: Dict) -> Dict:
+        return self.add_many([post])[0]
+
+    def add_many(self, posts: List[Dict]) -> List[Dict]:
+        records = []
+        with self._write() as conn:
+            for post in posts:
+                post = {k: v for k, v in post.items() if k != "replies"}
+                post["reply_count"] = 0
+                self._insert_post(conn, post)
+                records.append(
+                    self._record(
+                        conn, {"op": "create_post", "post_id": post["id"], "post": post}
+                    )
+                )
+        return records
+
+    def get(self, post_id: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM posts WHERE id = ?", (post_id,)).fetchone()
+        return self._row_to_post(row) if row else None
+
+    def like(self, post_id: str) -> Optional[int]:
+        row = self.conn.execute("SELECT likes FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if row is None:
+            return None
+        with self._likes_lock:
+            pending = self.pending_likes[post_id] = self.pending_likes.get(post_id, 0) + 1
+        return row["likes"] + pending
+
+    def record_likes(self, post_id: str, count: int) -> Dict:
+        return self.record_likes_many({post_id: count})[0]
+
+    def record_likes_many(self, counts: Dict[str, int]) -> List[Dict]:
+        """Write the counts in one transaction; they stay pending if it fails"""
+        records = []
+        with self._write() as conn:
+            for post_id, count in counts.items():
+                conn.execute("UPDATE posts SET likes = likes + ? WHERE id = ?", (count, post_id))
+                likes = conn.execute(
+                    "SELECT likes FROM posts WHERE id = ?", (post_id,)
+                ).fetchone()["likes"]
+                records.append(
+                    self._record(
+                        conn, {"op": "like", "post_id": post_id, "count": count, "likes": likes}
+                    )
+                )
+        with self._likes_lock:
+            for post_id, count in counts.items():
+                remaining = self.pending_likes.get(post_id, 0) - count
+                if remaining > 0:
+                    self.pending_likes[post_id] = remaining
+                else:
+                    self.pending_likes.pop(post_id, None)
+        return records
+
+    def add_reply(self, post_id: str, reply: Dict) -> Optional[Dict]:
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT reply_count FROM posts WHERE id = ?", (post_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "INSERT INTO replies (post_id, position, data) VALUES (?, ?, ?)",
+                (post_id, row["reply_count"], _dumps(reply)),
+            )
+            conn.execute(
+                "UPDATE posts SET reply_count = reply_count + 1 WHERE id = ?", (post_id,)
+            )
+            return self._record(
+                conn, {"op": "create_reply", "post_id": post_id, "reply": dict(reply)}
+            )
+
+    def set_image_variants(self, post_id: str, variants: Dict[str, str]) -> Optional[Dict]:
+        with self._write() as conn:
+            row = conn.execute("SELECT data FROM posts WHERE id = ?", (post_id,)).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row["data"])
+            data["image_variants"] = variants
+            conn.execute("UPDATE posts SET data = ? WHERE id = ?", (_dumps(data), post_id))
+            return self._record(
+                conn,
+                {"op": "set_image_variants", "post_id": post_id, "image_variants": dict(variants)},
+            )
+
+    def page(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[str, str]] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict]:
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(cursor)
+        if before is not None:
+            clauses.append("created_at < ?")
+            params.append(before)
+        if after is not None:
+            clauses.append("created_at > ?")
+            params.append(after)
+        sql = "SELECT * FROM posts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._row_to_post(row) for row in self.conn.execute(sql, params)]
+
+    def reply_page(
+        self, post_id: str, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT data FROM replies WHERE post_id = ? AND position >= ? "
+            "ORDER BY position LIMIT ?",
+            (post_id, offset, -1 if limit is None else limit),
+        )
+        return [json.loads(row["data"]) for row in rows]
+
+    def reply_preview(self, post_id: str, count: int) -> List[Dict]:
+        if count <= 0:
+            return []
+        rows = self.conn.execute(
+            "SELECT data FROM replies WHERE post_id = ? ORDER BY position DESC LIMIT ?",
+            (post_id, count),
+        ).fetchall()
+        return [json.loads(row["data"]) for row in reversed(rows)]
+
+    def changes_since(self, since: int, limit: int) -> Tuple[List[Dict], bool]:
+        first = self.conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        seq = self.seq
+        if since > seq or (first is not None and since < first - 1) or (
+            first is None and since < seq
+        ):
+            return [], True
+        changes = []
+        for row in self.conn.execute(
+            "SELECT seq, data FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (since, limit),
+        ):
+            record = json.loads(row["data"])
+            record["seq"] = row["seq"]
+            changes.append(record)
+        return changes, False
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in self.conn.execute("SELECT * FROM posts ORDER BY created_at, id"):
+            yield self._row_to_post(row)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.write_conn.close()
+        self.conn.close()
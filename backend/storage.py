@@ -0,0 +1,367 @@
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from backend.segments import SegmentStore
+from backend.snapshot import (
+    BinarySnapshot,
+    LazyPosts,
+    read_json_snapshot,
+    write_binary_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+def apply_record(posts: List[Dict], by_id: Dict[str, Dict], record: Dict) -> None:
+    """Apply a single logged mutation to an in-memory list of posts.
+
+    Nothing from record is stored by reference: the records the writer thread
+    applies are the same objects the store journals and streams to clients.
+    """
+    op = record.get("op")
+    if op == "create_post":
+        post = copy.deepcopy(record["post"])
+        posts.append(post)
+        by_id[post["id"]] = post
+    elif op == "like":
+        post = by_id.get(record["post_id"])
+        if post is not None:
+            post["likes"] = post.get("likes", 0) + record.get("count", 1)
+    elif op == "create_reply":
+        post = by_id.get(record["post_id"])
+        if post is not None:
+            post.setdefault("replies", []).append(dict(record["reply"]))
+    elif op == "set_image_variants":
+        post = by_id.get(record["post_id"])
+        if post is not None:
+            post["image_variants"] = dict(record["image_variants"])
+    else:
+        logger.warning(f"Skipping unknown log record: {op}")
+
+class PostLog:
+    """Snapshot file plus an append-only write-ahead log of post mutations.
+
+    Every mutation is appended to the log as one JSON line tagged with a
+    sequence number. Compaction rotates the live log aside and folds the
+    rotated segment into the snapshot on disk, so it never has to touch the
+    in-memory posts the API is serving. The snapshot remembers the last folded
+    sequence number, which makes replaying a half-compacted log harmless.
+
+    With binary_path set, snapshots are written in the binary format there
+    instead, and the JSON snapshot is only read until the first one exists.
+    With segment_dir set, the snapshot is split into per-day segments there
+    (see SegmentStore) and compaction only rewrites the days the log touched;
+    the single-file snapshot is then only read to create the first segments.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        log_path: str,
+        fsync: bool = False,
+        binary_path: Optional[str] = None,
+        segment_dir: Optional[str] = None,
+    ):
+        self.snapshot_path = snapshot_path
+        self.binary_path = binary_path
+        self.day_segments = SegmentStore(segment_dir) if segment_dir else None
+        self.log_path = log_path
+        self.segment_path = f"{log_path}.1"
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._file = None
+        self.seq = 0
+        # Highest seq reflected in the snapshot
+        self.folded_seq = 0
+
+    def _read_snapshot(self, lazy: bool = False) -> Tuple[Union[List[Dict], LazyPosts], int]:
+        if self.binary_path and os.path.exists(self.binary_path):
+            snapshot = BinarySnapshot(self.binary_path)
+            return (LazyPosts(snapshot) if lazy else list(snapshot)), snapshot.seq
+        if not os.path.exists(self.snapshot_path):
+            return [], 0
+        return read_json_snapshot(self.snapshot_path)
+
+    def write_snapshot(self, posts: List[Dict], seq: int) -> None:
+        if self.day_segments is not None:
+            self.day_segments.write_all(posts, seq)
+        elif self.binary_path:
+            write_binary_snapshot(self.binary_path, posts, seq)
+        else:
+            write_snapshot(self.snapshot_path, {"seq": seq, "posts": posts})
+        self.folded_seq = seq
+
+    def _read_records(self, path: str) -> Iterator[Dict]:
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final write from a crash; everything before it is intact
+                    logger.warning(f"Ignoring truncated record in {path}")
+                    return
+
+    def _replay(
+        self, path: str, posts: List[Dict], by_id: Dict[str, Dict], after_seq: int
+    ) -> Tuple[int, int]:
+        """Apply records newer than after_seq; returns (count, last applied seq)"""
+        count, last_seq = 0, after_seq
+        for record in self._read_records(path):
+            seq = record.get("seq", 0)
+            if seq <= after_seq:
+                continue
+            apply_record(posts, by_id, record)
+            last_seq = max(last_seq, seq)
+            count += 1
+        return count, last_seq
+
+    def load(
+        self, lazy: bool = False, hot_from: Optional[str] = None
+    ) -> Union[List[Dict], LazyPosts]:
+        """Load the snapshot and replay any logged mutations on top of it.
+
+        With lazy, a binary snapshot comes back as LazyPosts: only the posts
+        the log touches are decoded now, the rest on first access. From
+        segments, hot_from limits the result to posts of that day and later
+        plus older posts the log changes.
+        """
+        if self.day_segments is not None and self.day_segments.seqs:
+            return self._load_segments(hot_from)
+        posts, seq = self._read_snapshot(lazy)
+        self.folded_seq = seq
+        if isinstance(posts, LazyPosts):
+            by_id = posts.by_id
+        else:
+            by_id = {post["id"]: post for post in posts}
+        replayed = 0
+        for path in (self.segment_path, self.log_path):
+            count, seq = self._replay(path, posts, by_id, seq)
+            replayed += count
+        self.seq = max(self.seq, seq)
+        if replayed:
+            logger.info(f"Replayed {replayed} log records onto {len(posts)} posts")
+        return posts
+
+    def _load_segments(self, hot_from: Optional[str]) -> List[Dict]:
+        segments = self.day_segments
+        posts = []
+        for day in segments.days:
+            if hot_from is None or day >= hot_from:
+                posts.extend(segments.read_day(day))
+        by_id = {post["id"]: post for post in posts}
+        seq = segments.seq
+        replayed = 0
+        for path in (self.segment_path, self.log_path):
+            for record in self._read_records(path):
+                day = segments.day_of_record(record, by_id)
+                if day is None or segments.is_folded(record, day):
+                    continue
+                if record.get("op") != "create_post" and record["post_id"] not in by_id:
+                    # An older post the log changes is loaded to apply it to
+                    post = segments.read(record["post_id"])
+                    posts.append(post)
+                    by_id[post["id"]] = post
+                apply_record(posts, by_id, record)
+                seq = max(seq, record.get("seq", 0))
+                replayed += 1
+        self.seq = max(self.seq, seq)
+        self.folded_seq = segments.seq
+        logger.info(
+            f"Loaded {len(posts)} of {len(segments)} posts from segments, "
+            f"replaying {replayed} log records"
+        )
+        return posts
+
+    def append(self, record: Dict) -> None:
+        """Append one mutation record, already stamped with its seq, to the log"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]) -> None:
+        """Append a batch of records with a single write and at most one fsync"""
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        with self._lock:
+            self.seq = records[-1]["seq"]
+            if self._file is None:
+                self._file = open(self.log_path, "a")
+            self._file.write(lines)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def _rotate(self) -> bool:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
+                return False
+            os.replace(self.log_path, self.segment_path)
+            return True
+
+    def compact(self) -> bool:
+        """Fold the log into the snapshot. Returns True if anything was folded."""
+        with self._compact_lock:
+            migrated = self._split_snapshot()
+            # A segment left behind by an interrupted compaction is folded first
+            if not os.path.exists(self.segment_path) and not self._rotate():
+                return migrated
+            if self.day_segments is not None:
+                replayed = self._compact_segments()
+                os.remove(self.segment_path)
+                logger.info(f"Compacted {replayed} log records into day segments")
+                return True
+            posts, snapshot_seq = self._read_snapshot()
+            by_id = {post["id"]: post for post in posts}
+            replayed, folded_seq = self._replay(
+                self.segment_path, posts, by_id, snapshot_seq
+            )
+            self.write_snapshot(posts, folded_seq)
+            os.remove(self.segment_path)
+            logger.info(
+                f"Compacted {replayed} log records into "
+                f"{self.binary_path or self.snapshot_path}"
+            )
+            return True
+
+    def _split_snapshot(self) -> bool:
+        """Carry a single-file snapshot over into day segments, once"""
+        if self.day_segments is None or self.day_segments.seqs:
+            return False
+        posts, snapshot_seq = self._read_snapshot()
+        if not posts:
+            return False
+        self.day_segments.write_all(posts, snapshot_seq)
+        self.folded_seq = max(self.folded_seq, snapshot_seq)
+        logger.info(f"Split {len(posts)} posts from the snapshot into day segments")
+        return True
+
+    def _compact_segments(self) -> int:
+        """Fold the rotated log into the day segments of the posts it changes"""
+        segments = self.day_segments
+        records = list(self._read_records(self.segment_path))
+        created: Dict[str, Dict] = {}
+        by_day: Dict[str, List[Dict]] = {}
+        for record in records:
+            if record.get("op") == "create_post":
+                created[record["post_id"]] = record["post"]
+            day = segments.day_of_record(record, created)
+            if day is None:
+                logger.warning(f"Skipping log record for unknown post {record['post_id']}")
+                continue
+            by_day.setdefault(day, []).append(record)
+        folded_seq = max((record.get("seq", 0) for record in records), default=segments.seq)
+        for day, day_records in by_day.items():
+            posts = segments.read_day(day)
+            by_id = {post["id"]: post for post in posts}
+            for record in day_records:
+                if not segments.is_folded(record, day):
+                    apply_record(posts, by_id, record)
+            segments.write(day, posts, max(folded_seq, segments.seqs.get(day, 0)))
+        self.folded_seq = max(self.folded_seq, folded_seq)
+        return len(records)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def write_snapshot(path: str, posts_data: Union[List[Dict], Dict]) -> None:
+    """Atomically replace the snapshot file with the given posts"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(posts_data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class PersistenceWriter:
+    """Background thread that owns every write to the post files.
+
+    Request handlers only enqueue mutation records. The writer drains whatever
+    has queued up since its last pass and persists it in one go: a single log
+    append in "wal" mode, or one snapshot covering the whole batch in
+    "snapshot" mode. In snapshot mode it serializes a private replica that it
+    keeps current by replaying the records, so it never reads the posts the
+    event loop is mutating.
+
+    With durability "fsync", submit() returns a future that resolves once the
+    record is on disk; with "async" it returns None.
+    """
+
+    _STOP = object()
+
+    def __init__(self, post_log: PostLog, mode: str = "wal", durability: str = "async"):
+        self.post_log = post_log
+        self.mode = mode
+        self.durability = durability
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="post-writer", daemon=True)
+        self._replica: List[Dict] = []
+        self._replica_by_id: Dict[str, Dict] = {}
+
+    def start(self) -> None:
+        if self.mode != "wal":
+            self._replica = self.post_log.load()
+            self._replica_by_id = {post["id"]: post for post in self._replica}
+        self._thread.start()
+
+    def submit(self, record: Dict) -> Optional[Future]:
+        return self.submit_many([record])
+
+    def submit_many(self, records: List[Dict]) -> Optional[Future]:
+        """Queue records that must reach disk together, in the same flush"""
+        future: Optional[Future] = Future() if self.durability == "fsync" else None
+        self._queue.put((records, future))
+        return future
+
+    def stop(self) -> None:
+        """Flush everything queued so far and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(item is self._STOP for item in batch)
+            items = [item for item in batch if item is not self._STOP]
+            if items:
+                self._flush(items)
+            if stopping:
+                return
+
+    def _flush(self, items: List[Tuple[List[Dict], Optional[Future]]]) -> None:
+        records = [record for batch, _ in items for record in batch]
+        try:
+            if self.mode == "wal":
+                self.post_log.append_many(records)
+            else:
+                for record in records:
+                    apply_record(self._replica, self._replica_by_id, record)
+                self.post_log.write_snapshot(self._replica, records[-1]["seq"])
+        except Exception as e:
+            logger.error(f"Error persisting {len(records)} post changes: {str(e)}")
+            for _, future in items:
+                if future is not None:
+                    future.set_exception(e)
+            return
+        for _, future in items:
+            if future is not None:
+                future.set_result(None)
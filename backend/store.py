@@ -0,0 +1,331 @@
+import copy
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from backend.records import PostRecord
+from backend.snapshot import LazyPosts
+
+# Sorts after any post id, so (ts, MAX_ID) bounds every key with that timestamp
+MAX_ID = "\U0010ffff"
+
+class BaseStore(ABC):
+    """Interface shared by the post storage backends.
+
+    Mutating methods apply the change and return its journal record, stamped
+    with a seq, or None if the post does not exist. Records have the shape
+    {"op", "post_id", "seq", ...} used by the write-ahead log, GET /changes
+    and the change stream. Backends must implement every abstract method;
+    one that misses any fails when it is constructed.
+    """
+
+    seq: int
+
+    @abstractmethod
+    def add(self, post: Dict) -> Dict:
+        ...
+
+    def add_many(self, posts: List[Dict]) -> List[Dict]:
+        return [self.add(post) for post in posts]
+
+    @abstractmethod
+    def get(self, post_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def like(self, post_id: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def record_likes(self, post_id: str, count: int) -> Dict:
+        ...
+
+    def record_likes_many(self, counts: Dict[str, int]) -> List[Dict]:
+        """Journal buffered likes for several posts, all or none"""
+        return [self.record_likes(post_id, count) for post_id, count in counts.items()]
+
+    @abstractmethod
+    def add_reply(self, post_id: str, reply: Dict) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def set_image_variants(self, post_id: str, variants: Dict[str, str]) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def page(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[str, str]] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def reply_page(
+        self, post_id: str, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def reply_preview(self, post_id: str, count: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def changes_since(self, since: int, limit: int) -> Tuple[List[Dict], bool]:
+        ...
+
+    def summaries(self) -> Iterator[Dict]:
+        """Yield at least the id, created_at and image of every post"""
+        return iter(self)
+
+    def scan(self) -> Iterator[Tuple[Dict, List[Dict]]]:
+        """Yield (post, replies) for every post, for building derived indexes"""
+        for post in list(self):
+            yield post, self.reply_page(post["id"])
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[Dict]:
+        ...
+
+class PostStore(BaseStore):
+    """In-memory posts with a primary-key index and a time-ordered index.
+
+    The list keeps insertion order for persistence; the dict gives O(1) lookup
+    by id. Both always hold the same objects, so mutating a post found through
+    one is visible through the other. by_time holds (created_at, id) keys in
+    ascending order; new posts land at the end, so keeping it sorted is cheap
+    and a newest-first page is a slice off the tail.
+
+    Posts are held as PostRecords rather than dicts to keep their footprint
+    small; dicts passed in are converted on the way in. Replies are kept out
+    of them, in per-post lists under replies, with only a reply_count on the
+    post itself. Feed payloads therefore do not grow with thread length, and
+    a thread can be paged on its own.
+
+    Every mutation is stamped with the next sequence number and kept in a
+    bounded in-memory journal, so pollers can ask for what changed since the
+    last seq they saw. The returned record is also what gets persisted.
+
+    Loaded from LazyPosts, posts stay in the binary snapshot until first
+    looked up by id; by_id decodes them on demand and by_time is built from
+    the snapshot index.
+    """
+
+    def __init__(
+        self,
+        posts: Optional[Union[List[Dict], LazyPosts]] = None,
+        seq: int = 0,
+        change_retention: int = 10000,
+    ):
+        self.posts: Union[List[Dict], LazyPosts] = []
+        self.by_id: Dict[str, Dict] = {}
+        self.by_time: List[Tuple[str, str]] = []
+        self.replies: Dict[str, List[Dict]] = {}
+        self.seq = 0
+        self.changes: List[Dict] = []
+        self.change_retention = change_retention
+        self.load(posts or [], seq)
+
+    def load(self, posts: Union[List[Dict], LazyPosts], seq: int = 0) -> None:
+        """Replace the store contents, rebuilding every index"""
+        self.posts = posts
+        self.replies = {}
+        if isinstance(posts, LazyPosts):
+            self.by_id = posts.by_id
+            # Posts the log replay already decoded; the rest convert as they load
+            for post_id, post in list(dict.items(self.by_id)):
+                self.by_id[post_id] = self._to_record(post)
+            posts.by_id.on_load = self._to_record
+        else:
+            self.posts = [self._to_record(post) for post in posts]
+            self.by_id = {post["id"]: post for post in self.posts}
+        source = posts.summaries() if isinstance(posts, LazyPosts) else self.posts
+        self.by_time = sorted((post["created_at"], post["id"]) for post in source)
+        self.seq = seq
+        self.changes = []
+
+    def _to_record(self, post: Dict) -> PostRecord:
+        # Persisted posts embed their replies; in memory they live separately
+        self.replies[post["id"]] = post.pop("replies", None) or []
+        post["reply_count"] = len(self.replies[post["id"]])
+        return PostRecord(post)
+
+    def _record(self, record: Dict) -> Dict:
+        self.seq += 1
+        record["seq"] = self.seq
+        self.changes.append(record)
+        # Trim in bulk so the journal costs amortized O(1) per change
+        if len(self.changes) > 2 * self.change_retention:
+            del self.changes[: -self.change_retention]
+        return record
+
+    def _for_update(self, post_id: str) -> Optional[PostRecord]:
+        """The post a mutation should change, or None if there is none"""
+        return self.by_id.get(post_id)
+
+    def _replies_of(self, post_id: str) -> List[Dict]:
+        return self.replies.get(post_id, [])
+
+    def add(self, post: Dict) -> Dict:
+        record = self._to_record(post)
+        self.posts.append(record)
+        self.by_id[post["id"]] = record
+        key = (post["created_at"], post["id"])
+        if not self.by_time or key > self.by_time[-1]:
+            self.by_time.append(key)
+        else:
+            insort(self.by_time, key)
+        # The stored record keeps changing; the journal must describe it as created
+        return self._record(
+            {"op": "create_post", "post_id": post["id"], "post": copy.deepcopy(post)}
+        )
+
+    def like(self, post_id: str) -> Optional[int]:
+        """Count a like immediately and return the new total.
+
+        Likes are not journaled one by one; the caller buffers them and later
+        calls record_likes with the accumulated count.
+        """
+        post = self._for_update(post_id)
+        if post is None:
+            return None
+        post["likes"] = post.get("likes", 0) + 1
+        return post["likes"]
+
+    def record_likes(self, post_id: str, count: int) -> Dict:
+        """Journal count likes already applied to a post by like()"""
+        return self._record(
+            {
+                "op": "like",
+                "post_id": post_id,
+                "count": count,
+                "likes": self.by_id[post_id]["likes"],
+            }
+        )
+
+    def add_reply(self, post_id: str, reply: Dict) -> Optional[Dict]:
+        post = self._for_update(post_id)
+        if post is None:
+            return None
+        self.replies[post_id].append(reply)
+        post["reply_count"] = len(self.replies[post_id])
+        return self._record(
+            {"op": "create_reply", "post_id": post_id, "reply": dict(reply)}
+        )
+
+    def set_image_variants(self, post_id: str, variants: Dict[str, str]) -> Optional[Dict]:
+        post = self._for_update(post_id)
+        if post is None:
+            return None
+        post["image_variants"] = variants
+        return self._record(
+            {"op": "set_image_variants", "post_id": post_id, "image_variants": dict(variants)}
+        )
+
+    def reply_page(
+        self, post_id: str, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict]:
+        """Return a post's replies oldest first, starting at offset.
+
+        Replies are only ever appended, so an offset stays a stable cursor.
+        """
+        replies = self._replies_of(post_id)
+        end = len(replies) if limit is None else offset + limit
+        return replies[offset:end]
+
+    def reply_preview(self, post_id: str, count: int) -> List[Dict]:
+        """Return the latest count replies of a post, oldest first"""
+        if count <= 0:
+            return []
+        return self._replies_of(post_id)[-count:]
+
+    def changes_since(self, since: int, limit: int) -> Tuple[List[Dict], bool]:
+        """Return up to limit changes after seq since, and whether the caller
+        must resync because since is outside the retained journal"""
+        first = self.seq - len(self.changes) + 1
+        if since < first - 1 or since > self.seq:
+            return [], True
+        start = since - first + 1
+        return self.changes[start : start + limit], False
+
+    def get(self, post_id: str) -> Optional[Dict]:
+        return self.by_id.get(post_id)
+
+    def page(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[str, str]] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict]:
+        """Return posts newest first.
+
+        cursor is the (created_at, id) key of the last post of the previous
+        page; before/after bound created_at exclusively.
+        """
+        hi = len(self.by_time)
+        if cursor is not None:
+            hi = bisect_left(self.by_time, cursor)
+        if before is not None:
+            hi = min(hi, bisect_left(self.by_time, (before,)))
+        lo = 0
+        if after is not None:
+            lo = bisect_right(self.by_time, (after, MAX_ID))
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return [self.by_id[post_id] for _, post_id in reversed(self.by_time[lo:hi])]
+
+    def summaries(self) -> Iterator[Dict]:
+        if isinstance(self.posts, LazyPosts):
+            return self.posts.summaries()
+        return iter(self.posts)
+
+    def scan(self) -> Iterator[Tuple[Dict, List[Dict]]]:
+        """Yield (post, replies) for every post, leaving undecoded posts in the
+        snapshot. Posts added while scanning are not included."""
+        if not isinstance(self.posts, LazyPosts):
+            for post in self.posts[: len(self.posts)]:
+                yield post, self.replies[post["id"]]
+            return
+        for post_id in self.posts.ids[: len(self.posts)]:
+            if post_id in self.replies:
+                yield self.by_id[post_id], self.replies[post_id]
+            else:
+                post = self.posts.snapshot.read(post_id)
+                yield post, post.pop("replies", None) or []
+
+    def __len__(self) -> int:
+        return len(self.posts)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.posts)
+
+class LikeBuffer:
+    """Likes counted in memory but not yet journaled, keyed by post id"""
+
+    def __init__(self):
+        self.pending: Dict[str, int] = {}
+        self.total = 0
+        # Every like ever added, flushed or not
+        self.added = 0
+
+    def add(self, post_id: str) -> None:
+        self.pending[post_id] = self.pending.get(post_id, 0) + 1
+        self.total += 1
+        self.added += 1
+
+    def drain(self) -> Dict[str, int]:
+        pending, self.pending, self.total = self.pending, {}, 0
+        return pending
+
+    def restore(self, pending: Dict[str, int]) -> None:
+        """Put back counts taken by drain() that could not be journaled"""
+        for post_id, count in pending.items():
+            self.pending[post_id] = self.pending.get(post_id, 0) + count
+            self.total += count
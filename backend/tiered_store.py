@@ -0,0 +1,218 @@
+import math
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from backend.records import PostRecord
+from backend.segments import SegmentStore, day_of, hot_cutoff
+from backend.store import MAX_ID, PostStore
+
+class TieredPostStore(PostStore):
+    """PostStore that keeps only recent posts in memory.
+
+    Posts from the last hot_days days are resident, as in PostStore. Older
+    posts stay in their day segments on disk. Reads of an old post (GET by
+    id, a /posts page reaching back, its replies) decode it into a small LRU
+    of cold posts without making it resident. A mutation promotes it to
+    resident, where it stays until compaction has folded the change into its
+    segment.
+
+    evict() runs after each compaction and drops posts that have aged out of
+    the hot window and have nothing left to persist, so resident memory is
+    bounded by recent activity rather than total history. What remains per
+    old post is its entry in the segment directory.
+    """
+
+    def __init__(
+        self,
+        segments: SegmentStore,
+        posts: Optional[List[Dict]] = None,
+        seq: int = 0,
+        change_retention: int = 10000,
+        hot_days: int = 7,
+        cold_cache_size: int = 1000,
+    ):
+        self.segments = segments
+        self.hot_days = hot_days
+        self.cold_cache_size = cold_cache_size
+        self.cold: "OrderedDict[str, Tuple[PostRecord, List[Dict]]]" = OrderedDict()
+        # Seq of the last change to each resident post; infinite while a
+        # change has been applied but not yet journaled
+        self.pinned: Dict[str, float] = {}
+        # Resident posts not yet written to any segment
+        self.unfolded: Set[str] = set()
+        super().__init__(posts, seq=seq, change_retention=change_retention)
+        cutoff = hot_cutoff(hot_days)
+        for post in self.posts:
+            if post["id"] not in segments.directory:
+                self.unfolded.add(post["id"])
+            elif day_of(post["created_at"]) < cutoff:
+                # Loaded because the log changed it
+                self.pinned[post["id"]] = seq
+
+    def _record(self, record: Dict) -> Dict:
+        record = super()._record(record)
+        self.pinned[record["post_id"]] = record["seq"]
+        return record
+
+    def _cold_entry(self, post_id: str) -> Optional[Tuple[PostRecord, List[Dict]]]:
+        entry = self.cold.get(post_id)
+        if entry is not None:
+            self.cold.move_to_end(post_id)
+            return entry
+        post = self.segments.read(post_id)
+        if post is None:
+            return None
+        replies = post.pop("replies", None) or []
+        post["reply_count"] = len(replies)
+        entry = self.cold[post_id] = (PostRecord(post), replies)
+        if len(self.cold) > self.cold_cache_size:
+            self.cold.popitem(last=False)
+        return entry
+
+    def _for_update(self, post_id: str) -> Optional[PostRecord]:
+        post = self.by_id.get(post_id)
+        if post is not None:
+            return post
+        entry = self._cold_entry(post_id)
+        if entry is None:
+            return None
+        # Promote: the change must stay in memory until it is compacted
+        post, replies = entry
+        del self.cold[post_id]
+        self.posts.append(post)
+        self.by_id[post_id] = post
+        self.replies[post_id] = replies
+        key = (post["created_at"], post_id)
+        self.by_time.insert(bisect_left(self.by_time, key), key)
+        return post
+
+    def _replies_of(self, post_id: str) -> List[Dict]:
+        replies = self.replies.get(post_id)
+        if replies is not None:
+            return replies
+        entry = self._cold_entry(post_id)
+        return entry[1] if entry else []
+
+    def add(self, post: Dict) -> Dict:
+        record = super().add(post)
+        self.unfolded.add(post["id"])
+        return record
+
+    def like(self, post_id: str) -> Optional[int]:
+        likes = super().like(post_id)
+        if likes is not None:
+            self.pinned[post_id] = math.inf
+        return likes
+
+    def get(self, post_id: str) -> Optional[Dict]:
+        post = self.by_id.get(post_id)
+        if post is not None:
+            return post
+        entry = self._cold_entry(post_id)
+        return entry[0] if entry else None
+
+    def _cold_keys(
+        self,
+        upper: Optional[Tuple[str, ...]],
+        after: Optional[str],
+    ) -> Iterator[Tuple[str, str]]:
+        """Keys of non-resident posts below upper, newest first"""
+        cutoff = hot_cutoff(self.hot_days)
+        for day in reversed(self.segments.days):
+            # Every post of a hot day is resident
+            if day >= cutoff or (upper is not None and day > upper[0][:10]):
+                continue
+            if after is not None and day < after[:10]:
+                break
+            keys = self.segments.keys(day)
+            hi = len(keys) if upper is None else bisect_left(keys, upper)
+            lo = 0 if after is None else bisect_right(keys, (after, MAX_ID))
+            for i in range(hi - 1, lo - 1, -1):
+                if keys[i][1] not in self.by_id:
+                    yield keys[i]
+
+    def page(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[str, str]] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict]:
+        """Return posts newest first, reading into cold segments as needed"""
+        resident = super().page(limit, cursor, before, after)
+        upper = cursor
+        if before is not None and (upper is None or (before,) < upper):
+            upper = (before,)
+        cold = []
+        for key in self._cold_keys(upper, after):
+            cold.append(key)
+            if limit is not None and len(cold) >= limit:
+                break
+        if not cold:
+            return resident
+        merged = [((post["created_at"], post["id"]), post) for post in resident]
+        merged.extend((key, None) for key in cold)
+        merged.sort(key=lambda item: item[0], reverse=True)
+        if limit is not None:
+            merged = merged[:limit]
+        return [post or self.get(key[1]) for key, post in merged]
+
+    def evict(self, folded_seq: int) -> int:
+        """Drop resident posts older than the hot window whose changes are all
+        in their segment. Returns how many were dropped."""
+        cutoff = hot_cutoff(self.hot_days)
+        directory = self.segments.directory
+        keep = []
+        for post in self.posts:
+            post_id = post["id"]
+            if (
+                day_of(post["created_at"]) < cutoff
+                and post_id in directory
+                and self.pinned.get(post_id, 0) <= folded_seq
+            ):
+                del self.by_id[post_id]
+                del self.replies[post_id]
+                self.pinned.pop(post_id, None)
+            else:
+                keep.append(post)
+        evicted = len(self.posts) - len(keep)
+        if evicted:
+            self.posts = keep
+            self.by_time = [key for key in self.by_time if key[1] in self.by_id]
+        self.unfolded = {post_id for post_id in self.unfolded if post_id not in directory}
+        return evicted
+
+    def _segment_posts(self, resident: Set[str]) -> Iterator[Dict]:
+        """Decode the posts of every segment that are not in resident"""
+        for day in self.segments.days:
+            for post in self.segments.read_day(day):
+                if post["id"] not in resident:
+                    yield post
+
+    def summaries(self) -> Iterator[Dict]:
+        resident = list(self.posts)
+        resident_ids = {post["id"] for post in resident}
+        for day in self.segments.days:
+            for entry in self.segments.entries(day):
+                if entry.id not in resident_ids:
+                    yield {"id": entry.id, "created_at": entry.created_at, "image": entry.image}
+        yield from resident
+
+    def scan(self) -> Iterator[Tuple[Dict, List[Dict]]]:
+        resident = list(self.posts)
+        for post in self._segment_posts({post["id"] for post in resident}):
+            yield post, post.pop("replies", None) or []
+        for post in resident:
+            yield post, self._replies_of(post["id"])
+
+    def __len__(self) -> int:
+        directory = self.segments.directory
+        return len(directory) + sum(1 for post_id in self.unfolded if post_id not in directory)
+
+    def __iter__(self) -> Iterator[Dict]:
+        resident = list(self.posts)
+        for post in self._segment_posts({post["id"] for post in resident}):
+            post["reply_count"] = len(post.pop("replies", None) or [])
+            yield post
+        yield from resident
@@ -0,0 +1,80 @@
+import heapq
+import math
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# Engagement weights: a reply signals more interest than a like
+POST_WEIGHT = 1.0
+LIKE_WEIGHT = 1.0
+REPLY_WEIGHT = 3.0
+
+def _log2_add(a: float, b: float) -> float:
+    """log2(2**a + 2**b) without overflowing"""
+    if a < b:
+        a, b = b, a
+    if b == -math.inf:
+        return a
+    return a + math.log2(1 + 2 ** (b - a))
+
+def timestamp(created_at: str) -> float:
+    return datetime.fromisoformat(created_at).timestamp()
+
+class TrendingIndex:
+    """Posts ranked by a time-decayed engagement score.
+
+    Every event on a post (its creation, a like, a reply) adds its weight,
+    halving every half_life seconds after it happened. Rather than decaying
+    every score as time passes, events are weighted up by 2 ** (t / half_life)
+    and the sum is kept in log2 space: all scores shrink at the same rate, so
+    their order never changes and a post only needs re-ranking when it gets a
+    new event.
+
+    The ranking is a heap with lazy deletion. An update pushes a fresh entry in
+    O(log N) and leaves the old one to be discarded when it surfaces; the heap
+    is rebuilt once stale entries outnumber live ones. top() pops the best k
+    and pushes them back, O(k log N) without touching the rest of the store.
+    """
+
+    def __init__(self, half_life: float = 6 * 3600):
+        self.half_life = half_life
+        self.keys: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def _boost(self, when: float, weight: float) -> float:
+        return math.log2(weight) + when / self.half_life
+
+    def add(self, post_id: str, weight: float, when: float | None = None) -> None:
+        """Record an event of the given weight on a post, now unless when is given"""
+        if when is None:
+            when = time.time()
+        old = self.keys.get(post_id, -math.inf)
+        key = _log2_add(old, self._boost(when, weight))
+        if key == old:
+            # Too old to move the score; pushing would duplicate the live entry
+            return
+        self.keys[post_id] = key
+        heapq.heappush(self._heap, (-key, post_id))
+        if len(self._heap) > 2 * len(self.keys) + 64:
+            self._heap = [(-key, post_id) for post_id, key in self.keys.items()]
+            heapq.heapify(self._heap)
+
+    def score(self, post_id: str, now: float | None = None) -> float:
+        """The post's decayed score at now"""
+        if post_id not in self.keys:
+            return 0.0
+        if now is None:
+            now = time.time()
+        return 2 ** (self.keys[post_id] - now / self.half_life)
+
+    def top(self, limit: int, offset: int = 0) -> List[str]:
+        """Return post ids ranked highest first, skipping the first offset"""
+        popped = []
+        while self._heap and len(popped) < offset + limit:
+            entry = heapq.heappop(self._heap)
+            # Drop entries superseded by a later update
+            if self.keys.get(entry[1]) == -entry[0]:
+                popped.append(entry)
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return [post_id for _, post_id in popped[offset:]]
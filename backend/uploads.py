@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Dict, Iterable
+
+from fastapi import HTTPException, Response, UploadFile
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+# Resized copies generated for every uploaded image, by maximum width
+IMAGE_VARIANTS = {"thumbnail": 160, "feed": 640}
+
+class UploadStore:
+    """Content-addressed store for uploaded images.
+
+    Files are named by the SHA-256 of their bytes, computed while streaming,
+    so identical uploads share one file and a URL always denotes the same
+    content and can be cached forever. refs counts the posts pointing at each
+    file; it is rebuilt from the posts on load rather than persisted.
+
+    refs only covers posts this process knows about. When several processes
+    share the upload directory, pass delete_unused=False: a file released
+    here may be in use by, or about to be reused by, another process's post.
+    Files released that way are left in place as orphans.
+    """
+
+    def __init__(
+        self, upload_dir: str, tmp_dir: str, max_size: int, delete_unused: bool = True
+    ):
+        self.upload_dir = upload_dir
+        self.tmp_dir = tmp_dir
+        self.max_size = max_size
+        self.delete_unused = delete_unused
+        self.refs: Dict[str, int] = {}
+
+    def load_refs(self, posts: Iterable[Dict]) -> None:
+        self.refs = {}
+        for post in posts:
+            if post.get("image"):
+                self.add_ref(post["image"])
+
+    def add_ref(self, url: str) -> None:
+        self.refs[url] = self.refs.get(url, 0) + 1
+
+    def release(self, url: str) -> None:
+        """Drop one reference, deleting the file and its variants at zero"""
+        count = self.refs.get(url, 0) - 1
+        if count > 0:
+            self.refs[url] = count
+            return
+        self.refs.pop(url, None)
+        if not self.delete_unused:
+            return
+        name, file_extension = os.path.splitext(os.path.basename(url))
+        for filename in [f"{name}{file_extension}"] + [
+            f"{name}_{variant}{file_extension}" for variant in IMAGE_VARIANTS
+        ]:
+            path = os.path.join(self.upload_dir, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def save(self, upload_file: UploadFile) -> str:
+        """Stream an upload into the store, take a reference and return its URL path.
+
+        The file is written chunk by chunk to a temp file outside the served
+        directory and renamed into place only once complete, so memory stays
+        at one chunk per request and readers never see a partial image. If
+        the content is already stored the temp file is simply discarded.
+        Uploads larger than max_size are rejected with 413 as soon as the
+        limit is crossed.
+        """
+        if upload_file.size is not None and upload_file.size > self.max_size:
+            raise HTTPException(status_code=413, detail="Upload too large")
+
+        file_extension = os.path.splitext(upload_file.filename or "")[1].lower()
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await upload_file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise HTTPException(status_code=413, detail="Upload too large")
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            filename = f"{digest.hexdigest()}{file_extension}"
+            path = os.path.join(self.upload_dir, filename)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                logger.info(f"Upload matches stored file {filename}")
+            else:
+                await asyncio.to_thread(os.replace, tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        url = f"/uploads/{filename}"
+        self.add_ref(url)
+        return url
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies larger than max_size with 413.
+
+    A declared Content-Length over the limit is refused before any of the body
+    is read. Otherwise bytes are counted as the body streams in, so a chunked
+    upload is cut off as soon as it crosses the limit rather than after the
+    form parser has spooled all of it to disk.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        too_large = JSONResponse(status_code=413, content={"detail": "Request too large"})
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_size:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Handled like any HTTPException by the endpoint that is
+                    # reading the body
+                    raise HTTPException(status_code=413, detail="Request too large")
+            return message
+
+        async def send_tracked(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_tracked)
+        except HTTPException as e:
+            # Raised outside an endpoint, e.g. while a middleware read the body
+            if e.status_code != 413 or response_started:
+                raise
+            await too_large(scope, receive, send)
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles that marks responses as cacheable forever.
+
+    Safe because uploads are content-addressed (or, for older uploads, named
+    by a post id) and never rewritten in place.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+def make_image_variants(path: str) -> Dict[str, str]:
+    """Write a resized copy of the image at path for each of IMAGE_VARIANTS.
+
+    Runs in a worker process. Variants are stored next to the original as
+    <name>_<variant><ext>; returns their file names keyed by variant. Images
+    already narrower than a variant are not upscaled. Variants that already
+    exist, because the same content was uploaded before, are reused. Each
+    call writes through its own temp files, so concurrent calls for the same
+    image do not interfere; whichever renames last wins with identical bytes.
+    """
+    from PIL import Image
+
+    directory, filename = os.path.split(path)
+    name, file_extension = os.path.splitext(filename)
+    variants = {
+        variant: f"{name}_{variant}{file_extension}" for variant in IMAGE_VARIANTS
+    }
+    missing = {
+        variant: width for variant, width in IMAGE_VARIANTS.items()
+        if not os.path.exists(os.path.join(directory, variants[variant]))
+    }
+    if not missing:
+        return variants
+    with Image.open(path) as image:
+        for variant, width in missing.items():
+            resized = image.copy()
+            resized.thumbnail((width, width * 4))
+            variant_name = variants[variant]
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix=f".{variant_name}.", suffix=".part"
+            )
+            os.close(fd)
+            try:
+                resized.save(tmp_path, format=image.format)
+                os.replace(tmp_path, os.path.join(directory, variant_name))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+    return variants
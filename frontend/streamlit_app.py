@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 from datetime import datetime
 import json
@@ -16,6 +16,8 @@ load_dotenv(dotenv_path=".env")        # Fall back to .env
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 AGENT_URL = os.getenv("AGENT_URL", "http://localhost:9000")
 REFRESH_INTERVAL = 30  # seconds
+REPLIES_PREVIEW = 3  # latest replies shown inline under each post
+REPLY_PAGE_SIZE = 20  # replies loaded per click when a thread is opened
 
 # Debug logging
 print(f"API_URL: {API_URL}")
@@ -162,6 +164,13 @@ if 'services_status' not in st.session_state:
     }
 if 'replying_to' not in st.session_state:
     st.session_state.replying_to = None
+if 'feed_seq' not in st.session_state:
+    st.session_state.feed_seq = 0
+if 'posts_etag' not in st.session_state:
+    st.session_state.posts_etag = None
+if 'threads' not in st.session_state:
+    # Opened threads by post id: replies loaded so far and the cursor for more
+    st.session_state.threads = {}
 
 def check_service_status():
     try:
@@ -188,7 +197,7 @@ def create_test_post():
         response.raise_for_status()
         st.success("Test post created successfully!")
         # Refresh the posts after creating a new one
-        st.session_state.posts = fetch_posts()
+        refresh_posts()
     except Exception as e:
         st.error(f"Error creating test post: {str(e)}")
         if hasattr(e, 'response') and e.response is not None:
@@ -217,16 +226,77 @@ def check_services():
         
     return status
 
-def fetch_posts() -> List[Dict]:
-    """Fetch posts from the backend API"""
+def fetch_posts() -> Optional[List[Dict]]:
+    """Fetch posts from the backend API, reusing the current ones if unchanged.
+    Returns None if the fetch failed."""
     try:
-        response = requests.get(f"{API_URL}/posts")
+        headers = {}
+        if st.session_state.posts_etag and st.session_state.posts:
+            headers["If-None-Match"] = st.session_state.posts_etag
+        response = requests.get(
+            f"{API_URL}/posts",
+            params={"limit": 10, "replies_preview": REPLIES_PREVIEW},  # Only the 10 most recent posts
+            headers=headers
+        )
+        if response.status_code == 304:
+            return st.session_state.posts
         response.raise_for_status()
-        return response.json()[:10]  # Only return the 10 most recent posts
+        st.session_state.posts_etag = response.headers.get("ETag")
+        return response.json()
     except Exception as e:
         logger.error(f"Error fetching posts: {str(e)}")
         st.error(f"Failed to fetch posts: {str(e)}")
-        return []
+        return None
+
+def refresh_posts() -> bool:
+    """Replace the shown posts with fresh ones, keeping them if the fetch fails"""
+    posts = fetch_posts()
+    if posts is None:
+        return False
+    st.session_state.posts = posts
+    return True
+
+def feed_changed() -> Tuple[bool, Optional[int]]:
+    """Check the backend change feed so idle refreshes skip refetching posts.
+
+    Returns whether to refetch and the seq the feed is at, to be stored once
+    the refetch succeeds; the seq is None if the check itself failed.
+    """
+    try:
+        response = requests.get(f"{API_URL}/changes", params={"since": st.session_state.feed_seq})
+        response.raise_for_status()
+        feed = response.json()
+        return feed["reset"] or bool(feed["changes"]), feed["seq"]
+    except Exception as e:
+        logger.error(f"Error checking for changes: {str(e)}")
+        return True, None
+
+def fetch_replies(post_id: str, cursor: Optional[str] = None) -> Optional[Dict]:
+    """Fetch one page of a post's reply thread, oldest first.
+    Returns the replies and the cursor of the next page, if any."""
+    try:
+        params = {"limit": REPLY_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{API_URL}/posts/{post_id}/replies", params=params)
+        response.raise_for_status()
+        return {"replies": response.json(), "cursor": response.headers.get("X-Next-Cursor")}
+    except Exception as e:
+        logger.error(f"Error fetching replies: {str(e)}")
+        st.error(f"Failed to fetch replies: {str(e)}")
+        return None
+
+def load_thread_page(post_id: str):
+    """Open a post's thread, or load its next page if it is already open"""
+    thread = st.session_state.threads.get(post_id)
+    page = fetch_replies(post_id, thread["cursor"] if thread else None)
+    if page is None:
+        return
+    if thread:
+        thread["replies"].extend(page["replies"])
+        thread["cursor"] = page["cursor"]
+    else:
+        st.session_state.threads[post_id] = page
 
 def create_post(content: str, image_bytes: Optional[bytes] = None) -> bool:
     """Create a new post with optional image"""
@@ -331,7 +401,9 @@ def display_post(post: Dict):
         
         # Image if present
         if post.get('image'):
-            st.image(post['image'])
+            # Prefer the feed-width variant once the backend has generated it
+            image_url = (post.get('image_variants') or {}).get('feed') or post['image']
+            st.image(f"{API_URL}{image_url}")
         
         # Interactive buttons using Streamlit components
         col1, col2, col3 = st.columns([1, 1, 2])
@@ -344,11 +416,26 @@ def display_post(post: Dict):
                 st.session_state.replying_to = post['id']
                 st.rerun()
         
-        # Display replies
-        if post.get('replies'):
+        # Display replies: the inline preview, or the thread once opened.
+        # Threads are only fetched on request, a page per click.
+        thread = st.session_state.threads.get(post['id'])
+        replies = thread["replies"] if thread else post.get('replies', [])
+        if replies:
             with st.container():
-                for reply in post['replies']:
+                for reply in replies:
                     display_reply(reply)
+        reply_count = post.get('reply_count', 0)
+        if thread:
+            if thread["cursor"] and st.button("Load more replies", key=f"more_replies_{post['id']}"):
+                load_thread_page(post['id'])
+                st.rerun()
+            if st.button("Hide replies", key=f"hide_replies_{post['id']}"):
+                del st.session_state.threads[post['id']]
+                st.rerun()
+        elif reply_count > len(replies):
+            if st.button(f"View all {reply_count} replies", key=f"view_replies_{post['id']}"):
+                load_thread_page(post['id'])
+                st.rerun()
         
         # Reply form
         if st.session_state.replying_to == post['id']:
@@ -424,7 +511,7 @@ with st.sidebar:
                            value=30)
     
     if st.button("🔄 Refresh Now"):
-        st.session_state.posts = fetch_posts()
+        refresh_posts()
         st.session_state.last_refresh = datetime.now()
         st.success("Feed refreshed!")
     
@@ -439,7 +526,7 @@ with st.sidebar:
             image_bytes = image.read() if image else None
             if create_post(content, image_bytes):
                 st.success("Post created successfully!")
-                st.session_state.posts = fetch_posts()
+                refresh_posts()
                 st.rerun()
 
 # Main feed
@@ -448,7 +535,12 @@ st.header("📱 Recent Posts")
 # Auto-refresh logic
 time_since_refresh = (datetime.now() - st.session_state.last_refresh).total_seconds()
 if time_since_refresh >= refresh_rate:
-    st.session_state.posts = fetch_posts()
+    changed, seq = feed_changed()
+    # Only move past the changes once the posts reflecting them are shown
+    if not changed:
+        st.session_state.feed_seq = seq
+    elif refresh_posts() and seq is not None:
+        st.session_state.feed_seq = seq
     st.session_state.last_refresh = datetime.now()
 
 # Display posts